@@ -0,0 +1,194 @@
+"""
+End-to-end throughput benchmark against the stand-in JSON-RPC server.
+
+For each input size, generates a file of synthetic addresses, starts
+bench/mock_rpc_server.py, and runs the full web3_address_recon.py pipeline
+in a fresh process pointed at it with a throwaway database. Reports
+addresses/sec, p50/p99 latency per pipeline stage, peak RSS and time spent
+committing to the database.
+
+    python bench/benchmark.py --sizes 1000,10000,100000 --latency-ms 40 -- -w 50
+    python bench/benchmark.py --sizes 1000000 --error-rate 0.02 -- -w 100 --batch-size 100
+    python bench/benchmark.py --sizes 10000 --network-rate 200 --sorted -- -w 50
+
+Arguments after `--` are passed to web3_address_recon.py.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from functools import wraps
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench.mock_rpc_server import synthetic_address
+
+NETWORKS = ["arbitrum", "avalanche", "base", "bsc", "ethereum", "linea", "optimism", "polygon", "sei", "zksync"]
+
+def generate_input(path: str, size: int, networks: list[str], grouped: bool = False):
+    # grouped: all of a network's addresses together, as in a file sorted by network
+    with open(path, "w") as f:
+        for i in range(size):
+            network = networks[i * len(networks) // size] if grouped else networks[i % len(networks)]
+            f.write(f"{network} {synthetic_address(f'input:{i}')}\n")
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def start_mock_server(args) -> tuple[subprocess.Popen, str]:
+    server = subprocess.Popen(
+        [
+            sys.executable, os.path.join(ROOT, "bench", "mock_rpc_server.py"),
+            "--port", "0",
+            "--latency-ms", str(args.latency_ms),
+            "--jitter-ms", str(args.jitter_ms),
+            "--error-rate", str(args.error_rate),
+            "--safe-pct", str(args.safe_pct),
+            "--network-rate", str(args.network_rate),
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    match = re.search(r"(http://\S+)", server.stdout.readline())
+    if not match:
+        server.kill()
+        raise RuntimeError("Mock RPC server did not start")
+    return server, match.group(1)
+
+def run_size(args, size: int, pipeline_args: list[str]) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        input_file = os.path.join(tmp, "input.txt")
+        generate_input(input_file, size, args.networks, args.sorted)
+
+        server, url = start_mock_server(args)
+        try:
+            env = dict(
+                os.environ,
+                ALCHEMY_API_KEY="",
+                RPC_URLS=",".join(f"{network}={url}/{network}" for network in args.networks),
+                SQLITE_DB_FILE=os.path.join(tmp, "bench.sqlite3"),
+                RPC_CACHE_FILE=os.path.join(tmp, "rpc-cache.sqlite3"),
+            )
+            child = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--run-pipeline", "--", "-f", input_file, *pipeline_args],
+                env=env,
+                cwd=ROOT,
+                stdout=subprocess.PIPE,
+                text=True,
+                check=True,
+            )
+        finally:
+            server.terminate()
+            server.wait()
+
+    return json.loads(child.stdout.strip().splitlines()[-1])
+
+def run_pipeline():
+    """Child process: run the real pipeline with per-stage timers and print a JSON summary."""
+    sys.argv = ["web3_address_recon.py", *sys.argv[sys.argv.index("--") + 1:]]
+    import web3_address_recon
+    from src.address_analyzer import AddressAnalyzer
+    from src.db_client import DBClient
+    from src.rpc_client.json_rpc_client import JsonRpcClient
+
+    timings: dict[str, list[float]] = {}
+
+    def timed(cls, attribute: str, stage: str):
+        original = getattr(cls, attribute)
+
+        @wraps(original)
+        async def wrapper(*a, **kw):
+            start = time.perf_counter()
+            try:
+                return await original(*a, **kw)
+            finally:
+                timings.setdefault(stage, []).append(time.perf_counter() - start)
+        setattr(cls, attribute, wrapper)
+
+    timed(AddressAnalyzer, "_analyze_address", "address")
+    timed(AddressAnalyzer, "_process_evm_properties", "evm_properties")
+    timed(AddressAnalyzer, "_process_safe_details", "safe_details")
+    timed(JsonRpcClient, "_post_batch", "rpc_post")
+    timed(DBClient, "add_address", "add_address")
+    timed(DBClient, "_write_batch", "db_commit")
+
+    start = time.perf_counter()
+    asyncio.run(web3_address_recon.main())
+    elapsed = time.perf_counter() - start
+
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        peak_rss *= 1024
+
+    processed = len(timings.get("address", []))
+    print(json.dumps({
+        "addresses": processed,
+        "elapsed": elapsed,
+        "addresses_per_sec": processed / elapsed if elapsed else 0,
+        "peak_rss_mb": peak_rss / 2**20,
+        "db_write_time": sum(timings.get("db_commit", [])),
+        "stages": {
+            stage: {"count": len(values), "p50": percentile(values, 50), "p99": percentile(values, 99)}
+            for stage, values in timings.items()
+        },
+    }))
+
+def print_report(size: int, result: dict):
+    print(f"\n== {size} lines: {result['addresses']} addresses in {result['elapsed']:.2f}s "
+          f"({result['addresses_per_sec']:.1f} addr/s), peak RSS {result['peak_rss_mb']:.1f} MiB, "
+          f"DB write time {result['db_write_time']:.2f}s")
+    print(f"{'stage':<16}{'count':>10}{'p50 ms':>12}{'p99 ms':>12}")
+    for stage, stats in sorted(result["stages"].items()):
+        print(f"{stage:<16}{stats['count']:>10}{stats['p50'] * 1000:>12.2f}{stats['p99'] * 1000:>12.2f}")
+
+def create_parser():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark against a stand-in JSON-RPC server")
+    parser.add_argument('--sizes', type=str, default="1000,10000",
+                        help="Comma-separated input sizes, in lines (e.g. 1000,10000,100000,1000000)")
+    parser.add_argument('--networks', type=lambda s: s.split(","), default=NETWORKS,
+                        help="Comma-separated networks the input is spread over")
+    parser.add_argument('--latency-ms', type=float, default=20)
+    parser.add_argument('--jitter-ms', type=float, default=10)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument('--safe-pct', type=int, default=20)
+    parser.add_argument('--network-rate', type=float, default=0, help="Calls per second served per network, 0 for no limit")
+    parser.add_argument('--sorted', action='store_true', help="Group the input by network instead of interleaving it")
+    parser.add_argument('--json', action='store_true', help="Print results as JSON lines")
+    return parser
+
+def main():
+    if "--run-pipeline" in sys.argv:
+        run_pipeline()
+        return
+
+    argv = sys.argv[1:]
+    pipeline_args = []
+    if "--" in argv:
+        pipeline_args = argv[argv.index("--") + 1:]
+        argv = argv[:argv.index("--")]
+    args = create_parser().parse_args(argv)
+
+    # the benchmark measures the RPC path, not the response cache
+    if "--rpc-cache" not in pipeline_args:
+        pipeline_args += ["--rpc-cache", "bypass"]
+
+    for size in (int(s) for s in args.sizes.split(",")):
+        result = run_size(args, size, pipeline_args)
+        if args.json:
+            print(json.dumps({"size": size, **result}))
+        else:
+            print_report(size, result)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""
+Stand-in JSON-RPC server for benchmarks and local runs.
+
+Serves deterministic eth_getBalance / eth_getCode / eth_call / eth_blockNumber
+responses for synthetic addresses: every address is classified as an EOA, a
+plain contract or a Safe proxy from its own bytes, so any generated input file
+gives the same answers on every run. Safes answer masterCopy(), getThreshold(),
+nonce() and getOwners(), and owners are themselves synthetic addresses, so
+owner crawls find nested Safes. Every address holds some of TOKEN_COUNT
+synthetic ERC-20 tokens, served by balanceOf() and a paginated
+alchemy_getTokenBalances. Multicall3 aggregate3 is served at its
+canonical address, and JSON-RPC batches are supported.
+
+Every network is served under its own path, e.g. http://127.0.0.1:8545/ethereum.
+
+    python bench/mock_rpc_server.py --port 8545 --latency-ms 40 --jitter-ms 20 --error-rate 0.01
+
+`--network-rate` caps the calls per second each network serves, as a
+provider's plan does, answering 429 past it.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+MULTICALL3_ADDRESSES = {
+    "0xca11bde05977b3631167028862be2a173976ca11",
+    "0xf9cda624fbc7e059355ce98a31693d299facd963",
+}
+
+# GnosisSafeProxy 1.3.0 runtime code
+SAFE_PROXY_CODE = (
+    "0x608060405273ffffffffffffffffffffffffffffffffffffffff600054167fa619486e"
+    "0000000000000000000000000000000000000000000000000000000060003514156050"
+    "578060005260206000f35b3660008037600080366000845af43d6000803e6000811415"
+    "6070573d6000fd5b3d6000f3fea2646970667358221220d1429297349653a4918076d6"
+    "50332de1a1068c5f3e07c5c82360c277770b955264736f6c63430007060033"
+)
+CONTRACT_CODE = "0x6080604052348015600f57600080fd5b50600436106028576000"
+SAFE_SINGLETON = "d9db270c1b5e3bd161e8c8503c55ceabee709552"
+
+def synthetic_address(seed: str) -> str:
+    return "0x" + hashlib.sha256(seed.encode()).hexdigest()[:40]
+
+TOKEN_COUNT = 12
+TOKENS = [synthetic_address(f"token:{i}") for i in range(TOKEN_COUNT)]
+
+def _digest(address: str) -> int:
+    return int(hashlib.sha256(address.lower().encode()).hexdigest(), 16)
+
+def _word(value: int) -> str:
+    return f"{value:064x}"
+
+def _padded(data: str) -> str:
+    return data + "0" * (-len(data) % 64)
+
+class SyntheticChain:
+    def __init__(self, safe_pct: int, contract_pct: int):
+        self.safe_pct = safe_pct
+        self.contract_pct = contract_pct
+        self.block_number = 20_000_000
+
+    def kind(self, address: str) -> str:
+        bucket = int(address[-4:], 16) % 100
+        if bucket < self.safe_pct:
+            return "safe"
+        if bucket < self.safe_pct + self.contract_pct:
+            return "contract"
+        return "eoa"
+
+    def balance(self, address: str) -> int:
+        return _digest(address) % 10**20
+
+    def code(self, address: str) -> str:
+        return {"safe": SAFE_PROXY_CODE, "contract": CONTRACT_CODE, "eoa": "0x"}[self.kind(address)]
+
+    def token_balance(self, token: str, owner: str) -> int:
+        # about half of the tokens are held
+        digest = _digest(f"{token.lower()}:{owner.lower()}")
+        return digest % 10**24 if digest % 2 else 0
+
+    def token_balances(self, owner: str, options: dict) -> dict:
+        start = int(options.get("pageKey") or 0)
+        end = min(len(TOKENS), start + int(options.get("maxCount") or 100))
+        result = {
+            "address": owner,
+            "tokenBalances": [
+                {"contractAddress": token, "tokenBalance": "0x" + _word(self.token_balance(token, owner))}
+                for token in TOKENS[start:end]
+            ],
+        }
+        if end < len(TOKENS):
+            result["pageKey"] = str(end)
+        return result
+
+    def owners(self, address: str) -> list[str]:
+        count = 1 + _digest(address) % 4
+        return [synthetic_address(f"{address}:owner:{i}") for i in range(count)]
+
+    def call(self, to: str, data: str) -> tuple[bool, str]:
+        """Return (success, returnData) for an eth_call."""
+        to = to.lower()
+        selector = data[:10]
+        if to in MULTICALL3_ADDRESSES and selector == "0x82ad56cb":
+            return True, self._aggregate3(data)
+        if selector == "0x70a08231":
+            return True, "0x" + _word(self.token_balance(to, "0x" + data[-40:]))
+
+        kind = self.kind(to)
+        if kind == "eoa":
+            # calls to accounts without code succeed with no data
+            return True, "0x"
+        if kind == "contract":
+            return False, "0x"
+
+        owners = self.owners(to)
+        if selector == "0xa619486e":
+            return True, "0x" + _word(int(SAFE_SINGLETON, 16))
+        if selector == "0xe75235b8":
+            return True, "0x" + _word(1 + _digest(to) % len(owners))
+        if selector == "0xaffed0e0":
+            return True, "0x" + _word(_digest(to) % 1000)
+        if selector == "0xa0e67e2b":
+            return True, "0x" + _word(0x20) + _word(len(owners)) + "".join(_word(int(o, 16)) for o in owners)
+        return False, "0x"
+
+    def _aggregate3(self, data: str) -> str:
+        raw = data[10:]
+
+        def word(offset: int) -> int:
+            return int(raw[offset * 2:offset * 2 + 64], 16)
+
+        array_start = word(0)
+        length = word(array_start)
+        elements = array_start + 32
+        results = []
+        for i in range(length):
+            start = elements + word(elements + i * 32)
+            target = "0x" + raw[start * 2 + 24:start * 2 + 64]
+            data_start = start + word(start + 64)
+            calldata = "0x" + raw[(data_start + 32) * 2:(data_start + 32 + word(data_start)) * 2]
+            results.append(self.call(target, calldata))
+
+        heads, tails = [], []
+        offset = length * 32
+        for success, returned in results:
+            returned = returned[2:]
+            tail = _word(int(success)) + _word(0x40) + _word(len(returned) // 2) + _padded(returned)
+            heads.append(_word(offset))
+            tails.append(tail)
+            offset += len(tail) // 2
+        return "0x" + _word(0x20) + _word(length) + "".join(heads) + "".join(tails)
+
+    def handle(self, request: dict) -> dict:
+        method = request.get("method")
+        params = request.get("params") or []
+        response = {"jsonrpc": "2.0", "id": request.get("id")}
+        if method == "eth_blockNumber":
+            response["result"] = hex(self.block_number)
+        elif method == "eth_getBalance":
+            response["result"] = hex(self.balance(params[0]))
+        elif method == "eth_getCode":
+            response["result"] = self.code(params[0])
+        elif method == "alchemy_getTokenBalances":
+            options = params[2] if len(params) > 2 else {}
+            response["result"] = self.token_balances(params[0], options)
+        elif method == "eth_call":
+            success, returned = self.call(params[0]["to"], params[0].get("data", "0x"))
+            if success:
+                response["result"] = returned
+            else:
+                response["error"] = {"code": 3, "message": "execution reverted"}
+        else:
+            response["error"] = {"code": -32601, "message": f"Method {method} not supported"}
+        return response
+
+class MockRPCServer:
+    def __init__(self, chain: SyntheticChain, latency: float, jitter: float, error_rate: float, max_batch: int,
+                 network_rate: float = 0):
+        self.chain = chain
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.max_batch = max_batch
+        self.network_rate = network_rate
+        # network -> [tokens, last refill], of calls
+        self._buckets = {}
+        self.requests = 0
+        self.calls = 0
+        self.throttled = 0
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode().partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                parts = request_line.decode(errors="replace").split()
+                network = parts[1].strip("/") if len(parts) > 1 else ""
+                status, payload, extra = await self._respond(body, network)
+                self._write(writer, status, payload, extra)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, body: bytes, network: str) -> tuple[int, bytes, dict]:
+        self.requests += 1
+        await asyncio.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+        if random.random() < self.error_rate:
+            self.throttled += 1
+            return 429, b'{"error": "Too Many Requests"}', {"Retry-After": "1"}
+
+        try:
+            request = json.loads(body)
+        except ValueError:
+            return 400, b'{"error": "Invalid JSON"}', {}
+
+        if self.network_rate and not self._take(network, len(request) if isinstance(request, list) else 1):
+            self.throttled += 1
+            return 429, b'{"error": "Too Many Requests"}', {}
+
+        if isinstance(request, list):
+            if len(request) > self.max_batch:
+                error = {"jsonrpc": "2.0", "id": None, "error": {"code": -32600, "message": "Batch too large"}}
+                return 200, json.dumps(error).encode(), {}
+            self.calls += len(request)
+            return 200, json.dumps([self.chain.handle(r) for r in request]).encode(), {}
+
+        self.calls += 1
+        return 200, json.dumps(self.chain.handle(request)).encode(), {}
+
+    def _take(self, network: str, calls: int) -> bool:
+        now = time.monotonic()
+        bucket = self._buckets.setdefault(network, [self.network_rate, now])
+        bucket[0] = min(self.network_rate, bucket[0] + (now - bucket[1]) * self.network_rate)
+        bucket[1] = now
+        if bucket[0] < calls:
+            return False
+        bucket[0] -= calls
+        return True
+
+    def _write(self, writer: asyncio.StreamWriter, status: int, payload: bytes, extra: dict):
+        reason = {200: "OK", 400: "Bad Request", 429: "Too Many Requests"}[status]
+        headers = {"Content-Type": "application/json", "Content-Length": str(len(payload)), **extra}
+        head = f"HTTP/1.1 {status} {reason}\r\n" + "".join(f"{k}: {v}\r\n" for k, v in headers.items()) + "\r\n"
+        writer.write(head.encode() + payload)
+
+async def serve(args):
+    chain = SyntheticChain(args.safe_pct, args.contract_pct)
+    server = MockRPCServer(chain, args.latency_ms / 1000, args.jitter_ms / 1000, args.error_rate, args.max_batch,
+                           args.network_rate)
+    listener = await asyncio.start_server(server.handle_connection, args.host, args.port)
+    # the benchmark harness waits for this line before starting the pipeline
+    print(f"Listening on http://{args.host}:{listener.sockets[0].getsockname()[1]}", flush=True)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        logger.info(f"Served {server.requests} requests, {server.calls} calls, {server.throttled} throttled")
+
+def create_parser():
+    parser = argparse.ArgumentParser(description="Stand-in JSON-RPC server for synthetic addresses")
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8545, help="Port to listen on, 0 picks a free one")
+    parser.add_argument('--latency-ms', type=float, default=20, help="Base response latency")
+    parser.add_argument('--jitter-ms', type=float, default=10, help="Uniform jitter added to the latency")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument('--network-rate', type=float, default=0, help="Calls per second served per network, 0 for no limit")
+    parser.add_argument('--max-batch', type=int, default=1000, help="Largest JSON-RPC batch accepted")
+    parser.add_argument('--safe-pct', type=int, default=20, help="Percentage of addresses that are Safes")
+    parser.add_argument('--contract-pct', type=int, default=10, help="Percentage of addresses that are other contracts")
+    return parser
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(serve(create_parser().parse_args()))
+    except KeyboardInterrupt:
+        pass
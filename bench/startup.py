@@ -0,0 +1,105 @@
+"""
+Startup-time benchmark: wall time of short web3_address_recon.py runs,
+each in a fresh process, against the stand-in JSON-RPC server.
+
+    help      --help
+    import    importing the main packages as a library, no arguments, no API key
+    lookup    one address
+    query     an owner-safes lookup in the database the lookups filled
+    shards    one address with --processes 2, spawning the shard processes
+    python    a bare interpreter, for reference
+
+    python bench/startup.py --repeat 10
+    python bench/startup.py --scenarios help,lookup -- --tokens
+
+Arguments after `--` are passed to the lookup and shards runs.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench.benchmark import NETWORKS, generate_input, start_mock_server
+from bench.mock_rpc_server import synthetic_address
+
+SCENARIOS = ["python", "help", "import", "lookup", "query", "shards"]
+
+def commands(input_file: str, pipeline_args: list[str]) -> dict[str, list[str]]:
+    main = [sys.executable, os.path.join(ROOT, "web3_address_recon.py")]
+    return {
+        "python": [sys.executable, "-c", "pass"],
+        "help": [*main, "--help"],
+        "import": [sys.executable, "-c", "import src.db_client, src.rpc_client, src.address_analyzer"],
+        "lookup": [*main, "-f", input_file, *pipeline_args],
+        "query": [*main, "query", "owner-safes", synthetic_address("owner:0")],
+        "shards": [*main, "-f", input_file, "-p", "2", *pipeline_args],
+    }
+
+def time_command(command: list[str], env: dict[str, str]) -> float:
+    start = time.perf_counter()
+    subprocess.run(command, env=env, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - start
+
+def create_parser():
+    parser = argparse.ArgumentParser(description="Startup-time benchmark of short runs")
+    parser.add_argument('--scenarios', type=lambda s: s.split(","), default=SCENARIOS,
+                        help=f"Comma-separated scenarios, of {','.join(SCENARIOS)}")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs of each scenario, after one warm-up run")
+    parser.add_argument('--latency-ms', type=float, default=1)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--safe-pct', type=int, default=20)
+    parser.add_argument('--network-rate', type=float, default=0)
+    parser.add_argument('--json', action='store_true', help="Print results as JSON lines")
+    return parser
+
+def main():
+    argv = sys.argv[1:]
+    pipeline_args = []
+    if "--" in argv:
+        pipeline_args = argv[argv.index("--") + 1:]
+        argv = argv[:argv.index("--")]
+    args = create_parser().parse_args(argv)
+    if "--rpc-cache" not in pipeline_args:
+        pipeline_args += ["--rpc-cache", "bypass"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_file = os.path.join(tmp, "input.txt")
+        generate_input(input_file, 1, NETWORKS)
+        server, url = start_mock_server(args)
+        try:
+            env = dict(
+                os.environ,
+                ALCHEMY_API_KEY="",
+                RPC_URLS=",".join(f"{network}={url}/{network}" for network in NETWORKS),
+                SQLITE_DB_FILE=os.path.join(tmp, "bench.sqlite3"),
+                RPC_CACHE_FILE=os.path.join(tmp, "rpc-cache.sqlite3"),
+            )
+            # a library import has no configuration at all
+            bare_env = {name: value for name, value in env.items() if name not in ("ALCHEMY_API_KEY", "RPC_URLS")}
+            scenario_commands = commands(input_file, pipeline_args)
+
+            for scenario in args.scenarios:
+                scenario_env = bare_env if scenario == "import" else env
+                # the warm-up run also leaves the database and compiled queries in place
+                time_command(scenario_commands[scenario], scenario_env)
+                times = [time_command(scenario_commands[scenario], scenario_env) for _ in range(args.repeat)]
+                result = {"min": min(times), "median": statistics.median(times), "max": max(times)}
+                if args.json:
+                    print(json.dumps({"scenario": scenario, **result}))
+                else:
+                    print(f"{scenario:<8}{'min':>6} {result['min'] * 1000:7.1f} ms{'median':>10} "
+                          f"{result['median'] * 1000:7.1f} ms{'max':>6} {result['max'] * 1000:7.1f} ms", flush=True)
+        finally:
+            server.terminate()
+            server.wait()
+
+if __name__ == "__main__":
+    main()
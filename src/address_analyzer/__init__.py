@@ -1 +1,2 @@
 from .address_analyzer import AddressAnalyzer
+from .analysis_job import AnalysisJob
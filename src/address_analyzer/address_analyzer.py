@@ -1,38 +1,157 @@
 import asyncio
+import hashlib
 import logging
-from typing import List, Tuple, Set
+import time
+from typing import Any, AsyncIterable, Dict, Iterable, Tuple
 
 from src.config import config
+from src.metrics import registry
+from .analysis_job import AnalysisJob
+from .scheduler import NetworkScheduler
 
 logger = logging.getLogger(__name__)
 
+QUEUE_DEPTH = registry.gauge("analyzer_queue_depth", "Addresses waiting for a worker")
+BUSY_WORKERS = registry.gauge("analyzer_busy_workers", "Workers analyzing an address")
+ADDRESSES = registry.counter("analyzer_addresses_total", "Addresses analyzed by outcome", ("network", "outcome"))
+ADDRESS_SECONDS = registry.histogram(
+    "analyzer_address_seconds", "Time to analyze one address", ("network",))
+
 class AddressAnalyzer:
     def __init__(self, db_client, rpc_client):
         self.db_client = db_client
         self.rpc_client = rpc_client
-        self.queue = asyncio.Queue()
+        # (depth, network, address, source, job) in per-network queues, served
+        # in turns weighted by each network's rate budget; within a network,
+        # discovered owners first, then input in order. Input past the
+        # per-network buffer waits in a temporary file, and the reader waits
+        # once --max-queued input addresses are queued in all
+        self.queue = NetworkScheduler(config.args.workers, rpc_client.rate_budget, config.args.queue_size)
+        self._workers = []
+        # network -> snapshots.id of the block its calls are pinned to
+        self._snapshots = {}
+        self._snapshots_taken = False
 
-    async def process(self, addresses: List[Tuple[str, str]]):
-        if not addresses:
-            logger.info("No addresses to process.")
+    async def start(self):
+        """Take snapshots if asked to and start the workers, which run until stop()."""
+        if self._workers:
             return
+        if (config.args.snapshot or config.args.blocks) and not self._snapshots_taken:
+            await self.take_snapshots()
 
-        workers = [
+        self._workers = [
             asyncio.create_task(self._worker(f'worker-{i}'))
             for i in range(config.args.workers)
         ]
 
-        for network, address in addresses:
+    async def stop(self):
+        for w in self._workers:
+            w.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def process(self, addresses: Iterable[Tuple[str, str]] | AsyncIterable[Tuple[str, str]]):
+        await self.start()
+        try:
+            addresses = self._iterate(addresses)
+            if config.args.resume or config.args.max_age is not None:
+                addresses = self._skip_fresh(addresses)
+
+            # results are in the database, no need to keep them around
+            job = await self.submit(addresses, 'input-list', collect_results=False)
+            if not job.visited:
+                logger.info("No addresses to process.")
+
+            await self.queue.join()
+        finally:
+            await self.stop()
+
+    async def submit(self, addresses: Iterable[Tuple[str, str]] | AsyncIterable[Tuple[str, str]],
+                     source: str, collect_results: bool = True) -> AnalysisJob:
+        """
+        Queue the addresses for the running workers and return their job,
+        once every one of them is queued; await job.wait() for the results.
+        """
+        job = AnalysisJob(source, collect_results)
+        async for network, address in self._iterate(addresses):
             if network in self.rpc_client.client_map:
-                await self.queue.put((network, address, 'input-list'))
+                await self.queue.wait_for_room(config.args.max_queued)
+                self._enqueue(0, network, address, source, job)
             else:
                 logger.error(f"Unsupported network: {network}")
+        job.close()
+        return job
 
-        await self.queue.join()
+    async def take_snapshots(self) -> Dict[str, Tuple[int, int]]:
+        """Pin the networks asked for, returning network -> (block number, snapshot id)."""
+        snapshots = {}
+        pinned = dict(config.args.blocks)
+        networks = set(pinned)
+        if config.args.snapshot:
+            networks |= set(self.rpc_client.client_map)
 
-        for w in workers:
-            w.cancel()
-        await asyncio.gather(*workers, return_exceptions=True)
+        async def take(network: str):
+            if network not in self.rpc_client.client_map:
+                logger.error(f"Unsupported network: {network}")
+                return
+            block_number = pinned.get(network)
+            if block_number is None:
+                block_number = await self.rpc_client.get_block_number(network)
+            if block_number is None:
+                logger.error(f"Could not resolve a block for {network}, its calls use latest")
+                return
+
+            snapshots[network] = (block_number, await self.db_client.create_snapshot(network, block_number))
+            logger.info(f"Pinned {network} to block {block_number}")
+
+        await asyncio.gather(*(take(network) for network in sorted(networks)))
+        self.use_snapshots(snapshots)
+        return snapshots
+
+    def use_snapshots(self, snapshots: Dict[str, Tuple[int, int]]):
+        """Pin calls to snapshots taken by take_snapshots, possibly in another process."""
+        for network, (block_number, snapshot_id) in snapshots.items():
+            self.rpc_client.pin_block(network, block_number)
+            self._snapshots[network] = snapshot_id
+        self._snapshots_taken = True
+
+    async def _iterate(self, addresses):
+        if hasattr(addresses, '__aiter__'):
+            async for item in addresses:
+                yield item
+        else:
+            for item in addresses:
+                yield item
+
+    async def _skip_fresh(self, addresses, chunk_size: int = 500):
+        # one lookup per chunk rather than per address
+        chunk = []
+        async for pair in addresses:
+            chunk.append(pair)
+            if len(chunk) >= chunk_size:
+                for stale in await self._stale_pairs(chunk):
+                    yield stale
+                chunk = []
+        if chunk:
+            for stale in await self._stale_pairs(chunk):
+                yield stale
+
+    async def _stale_pairs(self, pairs):
+        fresh = await self.db_client.get_fresh_addresses(pairs, config.args.max_age)
+        if fresh:
+            logger.info(f"Skipping {len(fresh)} addresses with fresh results")
+        return [pair for pair in pairs if pair not in fresh]
+
+    def _enqueue(self, depth: int, network: str, address: str, source: str, job: AnalysisJob) -> bool:
+        # the 16-byte digest the file reader dedups by: hash() collisions would skip a distinct pair
+        key = hashlib.blake2b(f"{network} {address}".encode(), digest_size=16).digest()
+        if key in job.visited:
+            return False
+        job.visited.add(key)
+        job.added()
+        self.queue.put_nowait((depth, network, address, source, job))
+        QUEUE_DEPTH.set(self.queue.qsize())
+        return True
 
     async def _worker(self, name: str):
         while True:
@@ -42,44 +161,81 @@ class AddressAnalyzer:
             except asyncio.CancelledError:
                 break
 
+            depth, network, address, source, job = item
+            QUEUE_DEPTH.set(self.queue.qsize())
+            BUSY_WORKERS.inc()
+            start = time.perf_counter()
+            outcome = "error"
+            result = None
             try:
-                network, address, source = item
                 logger.info(f"[{name}] Processing: {network}:{address}")
-                await self._analyze_address(network, address, source)
+                result = await self._analyze_address(network, address, source, depth, job)
+                outcome = "ok"
             except Exception as e:
                 logger.error(f"Error in {name}: {e}", exc_info=True)
+                result = {"network": network, "address": address, "source": source, "depth": depth, "error": str(e)}
             finally:
-                self.queue.task_done()
+                job.completed(result)
+                BUSY_WORKERS.dec()
+                ADDRESS_SECONDS.observe(time.perf_counter() - start, network=network)
+                ADDRESSES.inc(network=network, outcome=outcome)
+                self.queue.task_done(network)
 
-    async def _analyze_address(self, network: str, address: str, source: str):
+    async def _analyze_address(self, network: str, address: str, source: str, depth: int = 0,
+                               job: AnalysisJob | None = None) -> Dict[str, Any]:
         address_id = await self.db_client.add_address(network, address, source)
         logger.info(f"Added address {network}:{address}. {address_id}")
 
-        is_safe = await self._process_evm_properties(address_id, network, address)
-        if is_safe:
-            await self._process_safe_details(address_id, network, address)
+        result = {"network": network, "address": address, "address_id": address_id, "source": source, "depth": depth}
+        if config.args.tokens:
+            evm_props, result["token_balances"] = await asyncio.gather(
+                self._process_evm_properties(address_id, network, address),
+                self._process_token_balances(address_id, network, address)
+            )
+        else:
+            evm_props = await self._process_evm_properties(address_id, network, address)
+        result.update(evm_props)
+        if evm_props["is_safe"]:
+            safe_wallet_data = await self._process_safe_details(address_id, network, address)
+            result.update(safe_wallet_data)
+            owners = safe_wallet_data["owners"]
+            if owners and depth < config.args.depth and job is not None:
+                for owner in owners:
+                    if self._enqueue(depth + 1, network, owner, f'safe-owner:{address_id}', job):
+                        logger.debug(f"Discovered owner {network}:{owner} of {address_id} at depth {depth + 1}")
+        return result
 
-    async def _process_evm_properties(self, address_id: int, network: str, address: str) -> bool:
+    async def _process_evm_properties(self, address_id: int, network: str, address: str) -> Dict[str, Any]:
         logger.debug(f"Request EVM properties for {address_id} - {network}:{address}")
         balance_task = self.rpc_client.get_native_balance(network, address)
-        is_eoa_task = self.rpc_client.is_eoa(network, address)
-        is_safe_task = self.rpc_client.is_safe(network, address)
+        # classified from the code; masterCopy() is only called when that can't tell
+        classify_task = self.rpc_client.classify_account(network, address)
 
-        balance, is_eoa, is_safe = await asyncio.gather(
-            balance_task, is_eoa_task, is_safe_task
-        )
+        balance, classification = await asyncio.gather(balance_task, classify_task)
+        is_eoa, is_safe = classification or (None, None)
 
         evm_props = {
             "native_balance": balance,
             "is_eoa": is_eoa,
             "is_safe": is_safe,
+            "snapshot_id": self._snapshots.get(network),
         }
         logger.info(f"EVM properties from {address_id} - {network}:{address} - {evm_props}")
         await self.db_client.save_evm_properties(address_id, evm_props)
 
-        return is_safe
+        return evm_props
 
-    async def _process_safe_details(self, address_id: int, network: str, address: str):
+    async def _process_token_balances(self, address_id: int, network: str, address: str) -> Dict[str, str] | None:
+        logger.debug(f"Request token balances for {address_id} - {network}:{address}")
+        balances = await self.rpc_client.get_token_balances(network, address)
+        # unknown, keep what is stored rather than clearing it
+        if balances is None:
+            return None
+        logger.info(f"Token balances from {address_id} - {network}:{address} - {len(balances)} tokens")
+        await self.db_client.save_token_balances(address_id, balances, self._snapshots.get(network))
+        return balances
+
+    async def _process_safe_details(self, address_id: int, network: str, address: str) -> Dict[str, Any]:
         logger.debug(f"Request safe details for {address_id} - {network}:{address}")
         threshold_task = self.rpc_client.get_safe_threshold(network, address)
         nonce_task = self.rpc_client.get_safe_nonce(network, address)
@@ -93,7 +249,10 @@ class AddressAnalyzer:
             "network": network,
             "threshold": threshold,
             "nonce": nonce,
+            "snapshot_id": self._snapshots.get(network),
         }
 
         logger.info(f"Safe details from {address_id} - {network}:{address} {safe_wallet_data}")
         await self.db_client.save_safe_wallet_data(address_id, owners, safe_wallet_data)
+
+        return {**safe_wallet_data, "owners": owners}
@@ -0,0 +1,61 @@
+import asyncio
+import time
+import uuid
+from typing import Any, Dict, List
+
+class AnalysisJob:
+    """
+    Addresses submitted together, plus the owners their crawl finds.
+    Keeps its own visited set, so a later job analyzes them again, and
+    the results when `collect_results` is set.
+    """
+    def __init__(self, source: str, collect_results: bool = True):
+        self.id = uuid.uuid4().hex
+        self.source = source
+        self.collect_results = collect_results
+        self.results: List[Dict[str, Any]] = []
+        # 16-byte digests of the (network, address) pairs enqueued
+        self.visited = set()
+        self.created_at = time.time()
+        self.finished_at = None
+        self._pending = 0
+        self._closed = False
+        self._done = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def added(self):
+        self._pending += 1
+
+    def completed(self, result: Dict[str, Any] | None):
+        if self.collect_results and result is not None:
+            self.results.append(result)
+        self._pending -= 1
+        self._check_done()
+
+    def close(self):
+        """No more input addresses: the job is done once the queued ones are."""
+        self._closed = True
+        self._check_done()
+
+    async def wait(self) -> List[Dict[str, Any]]:
+        await self._done.wait()
+        return self.results
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "source": self.source,
+            "status": "done" if self.done else "running",
+            "pending": self._pending,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "results": self.results,
+        }
+
+    def _check_done(self):
+        if self._closed and self._pending == 0 and not self.done:
+            self.finished_at = time.time()
+            self._done.set()
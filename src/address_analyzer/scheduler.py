@@ -0,0 +1,197 @@
+import asyncio
+import json
+import tempfile
+from collections import deque
+from typing import Callable, Dict, Tuple
+
+from src.metrics import registry
+from .analysis_job import AnalysisJob
+
+NETWORK_QUEUE_DEPTH = registry.gauge("analyzer_network_queue_depth", "Addresses waiting for a worker", ("network",))
+NETWORK_WORKERS = registry.gauge("analyzer_network_workers", "Workers analyzing an address", ("network",))
+NETWORK_ALLOTMENT = registry.gauge("analyzer_network_allotment", "Workers a network may use at once", ("network",))
+SPILLED = registry.counter(
+    "analyzer_spilled_total", "Input addresses parked in a temporary file, their network's buffer full", ("network",))
+
+# (depth, network, address, source, job)
+Item = Tuple[int, str, str, str, AnalysisJob]
+
+class _NetworkQueue:
+    """
+    One network's addresses: owners found by a crawl first, then input
+    addresses. Past `buffer_size` buffered input addresses, the rest wait
+    in a temporary file, so input sorted by network can be read ahead to
+    the other networks' addresses without holding it all in memory.
+    """
+    def __init__(self, network: str, buffer_size: int):
+        self.network = network
+        self._buffer_size = buffer_size
+        self._discovered = deque()
+        self._buffered = deque()
+        self._spill = None
+        self._spilled = 0
+        self._read_offset = 0
+        # jobs of the spilled addresses, by id, with their count
+        self._jobs: Dict[str, list] = {}
+
+    def __len__(self) -> int:
+        return len(self._discovered) + len(self._buffered) + self._spilled
+
+    def put(self, item: Item):
+        depth, _, address, source, job = item
+        if depth:
+            self._discovered.append(item)
+        elif not self._spilled and len(self._buffered) < self._buffer_size:
+            self._buffered.append(item)
+        else:
+            # once anything is spilled, later input goes after it to keep the order
+            if self._spill is None:
+                self._spill = tempfile.TemporaryFile("w+", prefix=f"recon-{self.network}-")
+            self._spill.seek(0, 2)
+            self._spill.write(json.dumps([address, source, job.id]) + "\n")
+            self._jobs.setdefault(job.id, [job, 0])[1] += 1
+            self._spilled += 1
+            SPILLED.inc(network=self.network)
+
+    def pop(self) -> Item:
+        if self._discovered:
+            return self._discovered.popleft()
+        if not self._buffered:
+            self._refill()
+        return self._buffered.popleft()
+
+    def _refill(self):
+        self._spill.flush()
+        self._spill.seek(self._read_offset)
+        for _ in range(min(self._spilled, self._buffer_size)):
+            address, source, job_id = json.loads(self._spill.readline())
+            entry = self._jobs[job_id]
+            entry[1] -= 1
+            if not entry[1]:
+                del self._jobs[job_id]
+            self._buffered.append((0, self.network, address, source, entry[0]))
+            self._spilled -= 1
+        self._read_offset = self._spill.tell()
+        if not self._spilled:
+            self._spill.close()
+            self._spill = None
+            self._read_offset = 0
+
+class NetworkScheduler:
+    """
+    Per-network queues served by deficit round-robin, in place of one FIFO
+    queue. Each network gets a share of the workers in proportion to its
+    current rate budget, and a turn in the round in proportion to it too,
+    so a slow or throttled network only holds its own share, and input
+    sorted by network still keeps every network busy.
+    """
+    def __init__(self, workers: int, rate_budget: Callable[[str], float], buffer_size: int):
+        self._workers = workers
+        self._rate_budget = rate_budget
+        self._buffer_size = buffer_size
+        self._queues: Dict[str, _NetworkQueue] = {}
+        # networks with queued addresses, in service order
+        self._ring = deque()
+        self._deficit: Dict[str, float] = {}
+        self._running: Dict[str, int] = {}
+        self._unfinished = 0
+        self._finished = asyncio.Event()
+        self._finished.set()
+        self._wakeup = asyncio.Event()
+        # input addresses queued, buffered or spilled, and a wakeup for a reader waiting on them
+        self._input_queued = 0
+        self._room = asyncio.Event()
+
+    def qsize(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def put_nowait(self, item: Item):
+        network = item[1]
+        queue = self._queues.get(network)
+        if queue is None:
+            queue = self._queues[network] = _NetworkQueue(network, self._buffer_size)
+        if not queue:
+            self._ring.append(network)
+            self._deficit[network] = 0.0
+        queue.put(item)
+        NETWORK_QUEUE_DEPTH.set(len(queue), network=network)
+        if not item[0]:
+            self._input_queued += 1
+        self._unfinished += 1
+        self._finished.clear()
+        self._wakeup.set()
+
+    async def wait_for_room(self, limit: int):
+        """Wait until fewer than `limit` input addresses are queued, in memory or spilled."""
+        while self._input_queued >= limit:
+            self._room.clear()
+            await self._room.wait()
+
+    async def get(self) -> Item:
+        while (item := self._next()) is None:
+            self._wakeup.clear()
+            await self._wakeup.wait()
+        return item
+
+    def task_done(self, network: str):
+        self._running[network] -= 1
+        NETWORK_WORKERS.set(self._running[network], network=network)
+        self._unfinished -= 1
+        if not self._unfinished:
+            self._finished.set()
+        # a worker slot of this network is free again
+        self._wakeup.set()
+
+    async def join(self):
+        await self._finished.wait()
+
+    def _next(self) -> Item | None:
+        if not self._ring:
+            return None
+        budgets, allotments = self._allotments()
+        if all(self._running.get(network, 0) >= allotments[network] for network in self._ring):
+            return None
+
+        # each turn adds the network's quantum, its share of the largest
+        # budget, and an address costs 1; networks at their allotment sit out
+        largest = max(budgets.values())
+        while True:
+            network = self._ring[0]
+            if self._running.get(network, 0) < allotments[network]:
+                if self._deficit[network] < 1:
+                    self._deficit[network] += budgets[network] / largest
+                if self._deficit[network] >= 1:
+                    break
+            self._ring.rotate(-1)
+
+        queue = self._queues[network]
+        item = queue.pop()
+        if not item[0]:
+            self._input_queued -= 1
+            self._room.set()
+        self._deficit[network] -= 1
+        self._running[network] = self._running.get(network, 0) + 1
+        NETWORK_WORKERS.set(self._running[network], network=network)
+        NETWORK_QUEUE_DEPTH.set(len(queue), network=network)
+        if not queue:
+            # an idle network doesn't keep its credit
+            self._ring.popleft()
+            self._deficit[network] = 0.0
+        elif self._deficit[network] < 1:
+            self._ring.rotate(-1)
+        return item
+
+    def _allotments(self) -> Tuple[Dict[str, float], Dict[str, int]]:
+        """
+        Rate budget of each network with queued addresses, and the workers
+        it may use: the ones not busy on other networks, split by budget.
+        """
+        busy_elsewhere = sum(count for network, count in self._running.items() if network not in self._ring)
+        spare = max(self._workers - busy_elsewhere, len(self._ring))
+        # 1 request/s is the throttles' floor, no network is starved entirely
+        budgets = {network: max(self._rate_budget(network), 1.0) for network in self._ring}
+        total = sum(budgets.values())
+        allotments = {network: max(1, round(spare * budget / total)) for network, budget in budgets.items()}
+        for network, allotment in allotments.items():
+            NETWORK_ALLOTMENT.set(allotment, network=network)
+        return budgets, allotments
@@ -3,13 +3,37 @@ import logging
 import os
 import sys
 
-from dotenv import load_dotenv
+# read from the environment on first access of any of them
+ENV_SETTINGS = {"ALCHEMY_API_KEY", "ALCHEMY_API_KEYS", "RPC_URLS", "SQLITE_DB_FILE", "RPC_CACHE_FILE"}
 
 class Config:
+    """
+    Settings from the environment, .env included, and from the command line,
+    each read on first use rather than at import: importing a module parses
+    nothing, and only the RPC clients need an API key. `parse()` takes an
+    argument list in place of sys.argv, to use the modules as a library.
+    """
     def __init__(self):
-        self._load_envs()
-        self._parser = self._create_parser()
-        self.args = self._parse_args()
+        self._envs_loaded = False
+        self._args = None
+        self._parsed = False
+
+    @property
+    def args(self):
+        if not self._parsed:
+            self.parse()
+        return self._args
+
+    def parse(self, argv: list[str] | None = None):
+        self._args = self._parse_args(sys.argv[1:] if argv is None else argv)
+        self._parsed = True
+        return self._args
+
+    def __getattr__(self, name: str):
+        if name in ENV_SETTINGS and not self._envs_loaded:
+            self._load_envs()
+            return getattr(self, name)
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
 
     def setup_logging(self):
         log_level = self.args.log_level.upper()
@@ -20,21 +44,33 @@ class Config:
         )
 
     def _load_envs(self):
+        self._envs_loaded = True
+        # imported here, --help doesn't need it
+        from dotenv import load_dotenv
         load_dotenv()
+        # one or more comma-separated keys, each one its own provider
         self.ALCHEMY_API_KEY = os.getenv("ALCHEMY_API_KEY")
-        if not self.ALCHEMY_API_KEY:
-          raise ValueError("ALCHEMY_API_KEY environment variable not set.")
+        self.ALCHEMY_API_KEYS = [key.strip() for key in (self.ALCHEMY_API_KEY or "").split(",") if key.strip()]
+
+        # extra JSON-RPC endpoints as comma-separated network=url pairs,
+        # e.g. "ethereum=http://localhost:8545,polygon=https://polygon-rpc.com"
+        self.RPC_URLS = []
+        for entry in (os.getenv("RPC_URLS") or "").split(","):
+            network, _, url = entry.strip().partition("=")
+            if network and url:
+                self.RPC_URLS.append((network.strip().lower(), url.strip()))
 
         self.SQLITE_DB_FILE = os.getenv("SQLITE_DB_FILE") or "./db/web3-address-recon.sqlite3"
+        self.RPC_CACHE_FILE = os.getenv("RPC_CACHE_FILE") or "./db/rpc-cache.sqlite3"
 
     def _create_parser(self):
-        parser = argparse.ArgumentParser(description="Web3 Address Reconnaissance Tool")
+        # no abbreviated options: they would take the query command's own ones, e.g. --network
+        parser = argparse.ArgumentParser(description="Web3 Address Reconnaissance Tool", allow_abbrev=False)
         parser.add_argument(
             '-f', '--file',
             dest='input_file',
             type=str,
-            required=True,
-            help="Path to the input TXT file")
+            help="Path to the input TXT file (required unless --serve, --export or query)")
         parser.add_argument(
             '-l', '--log-level',
             dest='log_level',
@@ -50,16 +86,366 @@ class Config:
             default=10,
             help="Number of concurrent workers"
         )
+        parser.add_argument(
+            '--queue-size',
+            dest='queue_size',
+            type=int,
+            default=1000,
+            help="Input addresses buffered in memory per network, the rest wait in a temporary file, "
+                 "up to --max-queued"
+        )
+        parser.add_argument(
+            '--max-queued',
+            dest='max_queued',
+            type=int,
+            default=100000,
+            help="Input addresses queued across networks, in memory and temporary files, before reading waits"
+        )
+        parser.add_argument(
+            '-p', '--processes',
+            dest='processes',
+            type=int,
+            default=1,
+            help="Shard the input across this many worker processes, each with its own event loop"
+        )
+        parser.add_argument(
+            '-d', '--depth',
+            dest='depth',
+            type=int,
+            default=0,
+            help="Also analyze Safe owners, recursively up to this many levels"
+        )
+        parser.add_argument(
+            '--resume',
+            dest='resume',
+            action='store_true',
+            help="Skip addresses whose results are already in the database"
+        )
+        parser.add_argument(
+            '--max-age',
+            dest='max_age',
+            type=int,
+            default=None,
+            help="With --resume, only skip results fetched within this many seconds (implies --resume)"
+        )
+        parser.add_argument(
+            '--tokens',
+            dest='tokens',
+            action='store_true',
+            help="Also collect ERC-20 token balances"
+        )
+        parser.add_argument(
+            '--token-list',
+            dest='token_list',
+            type=str,
+            default=None,
+            help="File of 'network 0xtoken' lines to query with balanceOf() where no holdings endpoint answers"
+        )
+        parser.add_argument(
+            '--snapshot',
+            dest='snapshot',
+            action='store_true',
+            help="Pin every call to one block per network, resolved at start"
+        )
+        parser.add_argument(
+            '--block',
+            dest='blocks',
+            type=self._network_block,
+            action='append',
+            default=[],
+            metavar='NETWORK=NUMBER',
+            help="Pin calls on a network to this block number (implies --snapshot for it), can be repeated"
+        )
+        parser.add_argument(
+            '--monitor',
+            dest='monitor',
+            action='store_true',
+            help="Only write results that changed since the last scan, and record each change in the history tables"
+        )
+        parser.add_argument(
+            '--no-summaries',
+            dest='summaries',
+            action='store_false',
+            help="Don't maintain the dashboard's summary tables, the next run with them rebuilds them"
+        )
+        parser.add_argument(
+            '--export',
+            dest='export_dir',
+            type=str,
+            default=None,
+            help="Write the dashboard's paginated JSON export of the database to this directory, then exit"
+        )
+        parser.add_argument(
+            '--export-page-size',
+            dest='export_page_size',
+            type=int,
+            default=1000,
+            help="Rows per page of the JSON export"
+        )
+        parser.add_argument(
+            '--rpc-cache',
+            dest='rpc_cache',
+            type=str,
+            default='use',
+            choices=['use', 'bypass', 'warm'],
+            help="Read and write the RPC response cache, bypass it, or only write to it"
+        )
+        parser.add_argument(
+            '--batch-size',
+            dest='batch_size',
+            type=int,
+            default=50,
+            help="Maximum number of JSON-RPC calls sent in one batch request"
+        )
+        parser.add_argument(
+            '--batch-window-ms',
+            dest='batch_window_ms',
+            type=float,
+            default=10,
+            help="Time to wait collecting calls before sending a batch, in milliseconds"
+        )
+        parser.add_argument(
+            '--multicall-size',
+            dest='multicall_size',
+            type=int,
+            default=500,
+            help="Maximum number of Safe calls packed into one Multicall3 call (0 disables it)"
+        )
+        parser.add_argument(
+            '--network-rate',
+            dest='network_rate',
+            type=float,
+            default=50,
+            help="Initial requests per second per network, adjusted from observed latency and throttling"
+        )
+        parser.add_argument(
+            '--network-concurrency',
+            dest='network_concurrency',
+            type=int,
+            default=10,
+            help="Initial in-flight requests per network, adjusted from observed latency and throttling"
+        )
+        parser.add_argument(
+            '--max-retries',
+            dest='max_retries',
+            type=int,
+            default=4,
+            help="Retries for throttled or failed RPC requests, with exponential backoff"
+        )
+        parser.add_argument(
+            '--no-hedge',
+            dest='hedge',
+            action='store_false',
+            help="Don't resend slow calls to a second provider when several serve a network"
+        )
+        parser.add_argument(
+            '--db-batch-size',
+            dest='db_batch_size',
+            type=int,
+            default=500,
+            help="Maximum number of records written in one DB transaction"
+        )
+        parser.add_argument(
+            '--db-batch-ms',
+            dest='db_batch_ms',
+            type=float,
+            default=50,
+            help="Time to wait collecting records before committing a DB transaction, in milliseconds"
+        )
+        parser.add_argument(
+            '--db-fast-sync',
+            dest='db_fast_sync',
+            action='store_true',
+            help="Only fsync the database at WAL checkpoints: faster commits, but a power loss "
+                 "can drop the last committed batches"
+        )
+        parser.add_argument(
+            '--serve',
+            dest='serve',
+            action='store_true',
+            help="Keep running and take addresses from the HTTP API, --socket or --watch-dir (and -f, if given)"
+        )
+        parser.add_argument(
+            '--port',
+            dest='port',
+            type=int,
+            default=8750,
+            help="With --serve, local port of the HTTP API (0 disables it)"
+        )
+        parser.add_argument(
+            '--socket',
+            dest='socket',
+            type=str,
+            default=None,
+            help="With --serve, also serve the HTTP API on this Unix socket"
+        )
+        parser.add_argument(
+            '--watch-dir',
+            dest='watch_dir',
+            type=str,
+            default=None,
+            help="With --serve, analyze the TXT files dropped in this directory, then move them to its done/ subdirectory"
+        )
+        parser.add_argument(
+            '--metrics-port',
+            dest='metrics_port',
+            type=int,
+            default=None,
+            help="Serve Prometheus metrics on this local port (shard N of --processes uses port + 1 + N)"
+        )
+        parser.add_argument(
+            '--profile',
+            dest='profile',
+            type=str,
+            default=None,
+            metavar='PREFIX',
+            help="Sample the run's stacks, writing PREFIX.collapsed for flamegraphs and a PREFIX.txt report"
+        )
+        parser.add_argument(
+            '--profile-interval-ms',
+            dest='profile_interval_ms',
+            type=float,
+            default=5,
+            help="Time between --profile samples, in milliseconds"
+        )
+        parser.add_argument(
+            '--metrics-summary',
+            dest='metrics_summary',
+            action='store_true',
+            help="Print a table of the collected metrics at the end of the run"
+        )
+        self._add_query_parser(parser)
         return parser
 
-    def _parse_args(self):
-        if len(sys.argv) > 1:
+    @staticmethod
+    def _add_query_parser(parser):
+        commands = parser.add_subparsers(dest='command', metavar='{query}')
+        query = commands.add_parser(
+            'query',
+            description="Reverse lookups over the results database, streamed to stdout",
+            help="Look up Safes by owner, owners by Safe, top balances or shared-owner clusters, then exit")
+        lookups = query.add_subparsers(dest='query', metavar='LOOKUP', required=True)
+
+        common = argparse.ArgumentParser(add_help=False)
+        common.add_argument(
+            '--format',
+            dest='format',
+            type=str,
+            default='jsonl',
+            choices=['jsonl', 'csv'],
+            help="Output format"
+        )
+        common.add_argument(
+            '--network',
+            dest='network',
+            type=str.lower,
+            default=None,
+            help="Only this network"
+        )
+
+        owner_safes = lookups.add_parser(
+            'owner-safes', parents=[common], help="Safes each of these addresses is an owner of, on every network")
+        owner_safes.add_argument('addresses', nargs='+', metavar='OWNER')
+        safe_owners = lookups.add_parser('safe-owners', parents=[common], help="Owners of these Safes")
+        safe_owners.add_argument('addresses', nargs='+', metavar='SAFE')
+
+        top = lookups.add_parser('top-balances', parents=[common], help="Addresses by native balance, largest first")
+        top.add_argument(
+            '--kind',
+            dest='kind',
+            type=str,
+            default=None,
+            choices=['eoa', 'safe', 'contract'],
+            help="Only addresses of this kind"
+        )
+        top.add_argument(
+            '--min-wei',
+            dest='min_wei',
+            type=Config._wei,
+            default='0',
+            help="Only balances of at least this many wei"
+        )
+        top.add_argument(
+            '--threshold',
+            dest='threshold',
+            type=int,
+            default=None,
+            help="Only Safes with this threshold (implies --kind safe)"
+        )
+        top.add_argument(
+            '--limit',
+            dest='limit',
+            type=int,
+            default=100,
+            help="Number of addresses to list (-1 for all)"
+        )
+
+        cluster = lookups.add_parser(
+            'cluster', parents=[common],
+            help="Safes linked to these owners or Safes through shared owners, as (depth, Safe, owner) rows")
+        cluster.add_argument('addresses', nargs='+', metavar='ADDRESS')
+        cluster.add_argument(
+            '--max-depth',
+            dest='max_depth',
+            type=int,
+            default=3,
+            help="Owner-to-Safe hops to follow from the given addresses"
+        )
+
+        changes = lookups.add_parser(
+            'changes', parents=[common], help="Changes recorded by --monitor runs, oldest first")
+        since = changes.add_mutually_exclusive_group(required=True)
+        since.add_argument(
+            '--since-block',
+            dest='since_block',
+            type=lambda s: int(s, 0),
+            default=None,
+            help="Only changes at snapshots after this block (needs --network)"
+        )
+        since.add_argument(
+            '--since',
+            dest='since',
+            type=int,
+            default=None,
+            help="Only changes fetched at or after this unix time"
+        )
+
+    @staticmethod
+    def _wei(value: str) -> str:
+        # compared with the stored balances as a decimal string
+        try:
+            wei = int(value, 0)
+        except ValueError:
+            wei = -1
+        if wei < 0:
+            raise argparse.ArgumentTypeError(f"Expected an amount of wei, got '{value}'")
+        return str(wei)
+
+    @staticmethod
+    def _network_block(value: str):
+        network, _, block = value.partition("=")
+        try:
+            return network.strip().lower(), int(block, 0)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Expected NETWORK=NUMBER, got '{value}'")
+
+    def _parse_args(self, argv: list[str]):
+        parser = self._create_parser()
+        if argv:
             try:
-                return self._parser.parse_args()
+                args = parser.parse_args(argv)
+                if not args.input_file and not args.serve and not args.export_dir and args.command != 'query':
+                    parser.error("the following arguments are required: -f/--file")
+                if args.command == 'query' and args.query == 'changes' and args.since_block is not None \
+                        and not args.network:
+                    parser.error("--since-block counts blocks of one network, it needs --network")
+                if args.export_dir and not args.summaries:
+                    parser.error("--export reads the summary tables, it can't be used with --no-summaries")
+                return args
             except SystemExit:
                 return None
         else:
-            self._parser.print_help()
+            parser.print_help()
             return None
 
 config = Config()
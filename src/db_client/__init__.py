@@ -1 +1,2 @@
 from .db_client import DBClient
+from .remote_db_client import RemoteDBClient, serve_db_requests
@@ -1,31 +1,68 @@
-import aiosql
 import aiosqlite
 import asyncio
 import logging
+import json
 import os
-from typing import Dict, Any, List
+import time
+from typing import AsyncIterator, Dict, Any, List, Set, Tuple
 
 from src.config import config
+from src.metrics import registry
+from src.sql_loader import load_queries
 from .decorators import locked
+from .summaries import Summaries
 
 logger = logging.getLogger(__name__)
 
+WRITE_QUEUE_DEPTH = registry.gauge("db_write_queue_depth", "Records waiting for the DB writer")
+BATCH_RECORDS = registry.histogram(
+    "db_batch_records", "Records written per DB transaction", buckets=(1, 5, 10, 50, 100, 250, 500, 1000, 5000))
+TRANSACTION_SECONDS = registry.histogram("db_transaction_seconds", "Time to write and commit a DB batch")
+COMMIT_SECONDS = registry.histogram("db_commit_seconds", "Time spent in commit()")
+
 class DBClient:
     def __init__(self):
         self._db_file = config.SQLITE_DB_FILE
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        queries_sql_file_path = os.path.join(current_dir, "queries.sql")
-        self._queries = aiosql.from_path(queries_sql_file_path, "aiosqlite")
+        # loaded by connect(), nothing runs a query before it
+        self._queries = None
         self._conn = None
         self._lock = asyncio.Lock()
 
+        # with --monitor, only changed state is written, along with its history
+        self._monitor = config.args.monitor
+        if self._monitor and config.args.max_age is not None:
+            logger.warning("With --monitor, fetched_at is when a result last changed, --max-age skips unchanged ones too")
+
+        # dashboard aggregates, updated along with every batch
+        self._summaries = None
+
+        # a query or an export only reads: no writer, and the summary tables
+        # are neither rebuilt nor cleared
+        self._read_only = config.args.command == "query" or bool(config.args.export_dir)
+
+        # write-behind pipeline: workers enqueue records, a single writer
+        # commits them in batches of up to N records or T milliseconds
+        self._batch_size = config.args.db_batch_size
+        self._batch_interval = config.args.db_batch_ms / 1000
+        self._write_queue = asyncio.Queue(maxsize=self._batch_size * 4)
+        self._writer_task = None
+
     async def connect(self):
         if self._conn:
             return
+        self._queries = load_queries(os.path.join(os.path.dirname(os.path.abspath(__file__)), "queries.sql"))
+        if config.args.summaries and not self._read_only:
+            self._summaries = Summaries(self._queries)
         self._conn = await aiosqlite.connect(self._db_file)
         await self._conn.execute("PRAGMA journal_mode=WAL")
+        if config.args.db_fast_sync:
+            # in WAL mode this only fsyncs at checkpoints; a power loss can lose
+            # the last transactions, which a --resume run fetches again
+            await self._conn.execute("PRAGMA synchronous=NORMAL")
         await self._conn.commit()
         await self._initialize_schema()
+        if not self._read_only:
+            self._writer_task = asyncio.create_task(self._writer())
 
     @locked("_lock")
     async def _initialize_schema(self):
@@ -34,57 +71,356 @@ class DBClient:
         await self._queries.create_evm_properties_table(self._conn)
         await self._queries.create_safe_wallets_table(self._conn)
         await self._queries.create_safe_wallet_owners_table(self._conn)
+        await self._queries.create_snapshots_table(self._conn)
+        await self._queries.create_token_balances_table(self._conn)
+        await self._queries.create_evm_properties_history_table(self._conn)
+        await self._queries.create_safe_wallets_history_table(self._conn)
+        await self._queries.create_safe_wallet_owners_history_table(self._conn)
+        await self._ensure_column("evm_properties", "fetched_at", "INTEGER")
+        await self._ensure_column("safe_wallets", "fetched_at", "INTEGER")
+        await self._ensure_column("evm_properties", "snapshot_id", "INTEGER REFERENCES snapshots (id)")
+        await self._ensure_column("safe_wallets", "snapshot_id", "INTEGER REFERENCES snapshots (id)")
         await self._conn.commit()
+        await self._queries.create_history_indexes(self._conn)
+        await self._queries.create_indexes(self._conn)
+        await self._queries.create_summary_tables(self._conn)
+        if self._summaries:
+            await self._summaries.load(self._conn)
+        elif not self._read_only:
+            await self._summaries_off()
 
-    @locked("_lock")
-    async def add_address(self, network: str, address: str, source: str) -> int:
-        result = await self._queries.insert_address(
-            self._conn,
-            network=network,
-            address=address,
-            source=source
-        )
-        if result:
+    async def _summaries_off(self):
+        # stale once a run doesn't maintain them, so dropped for a later run to rebuild
+        if await self._queries.get_summary_networks(self._conn):
+            logger.info("Clearing summary tables, they're rebuilt by the next run with summaries")
+            await self._queries.clear_summaries(self._conn)
             await self._conn.commit()
-            return result[0][0]
 
-        existing = await self._queries.get_address_id(
+    async def _ensure_column(self, table: str, column: str, definition: str):
+        # databases created by older versions lack columns added since
+        async with self._conn.execute(f"PRAGMA table_info({table})") as cur:
+            columns = [row[1] for row in await cur.fetchall()]
+        if column not in columns:
+            logger.info(f"Adding column {table}.{column}")
+            await self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    @locked("_lock")
+    async def create_snapshot(self, network: str, block_number: int) -> int:
+        snapshot_id = await self._queries.insert_snapshot(
             self._conn,
             network=network,
-            address=address
+            block_number=block_number,
+            created_at=int(time.time())
         )
-        return existing[0]
+        await self._conn.commit()
+        return snapshot_id
 
     @locked("_lock")
-    async def save_evm_properties(self, address_id: int, properties: Dict[str, Any]):
-        await self._queries.upsert_evm_properties(
+    async def get_fresh_addresses(self, pairs: List[Tuple[str, str]], max_age: int | None) -> Set[Tuple[str, str]]:
+        """
+        Return the (network, address) pairs whose results were fetched
+        within the last `max_age` seconds, or at any time if it is None.
+        """
+        cutoff = int(time.time()) - max_age if max_age is not None else 0
+        rows = await self._queries.get_fresh_addresses(
             self._conn,
-            address_id=address_id,
-            native_balance=properties.get('native_balance'),
-            is_eoa=properties.get('is_eoa'),
-            is_safe=properties.get('is_safe'),
+            pairs=json.dumps(pairs),
+            cutoff=cutoff
         )
-        await self._conn.commit()
+        return {(network, address) for network, address in rows}
 
     @locked("_lock")
+    async def get_changes_since(self, network: str | None = None, block_number: int | None = None,
+                                since: int | None = None) -> List[Dict[str, Any]]:
+        """
+        Changes recorded by --monitor runs on `network` at snapshots after
+        `block_number`, or at or after unix time `since`, on `network` or on
+        every network.
+        """
+        if block_number is not None:
+            rows = await self._queries.get_changes_since_block(
+                self._conn, network=network, block_number=block_number)
+        else:
+            rows = await self._queries.get_changes_since_time(self._conn, since=since or 0, network=network)
+        return [
+            {
+                "network": network,
+                "address": address,
+                "kind": kind,
+                "detail": json.loads(detail),
+                "fetched_at": fetched_at,
+                "block_number": block,
+            }
+            for network, address, kind, detail, fetched_at, block in rows
+        ]
+
+    @locked("_lock")
+    async def summaries_missing(self) -> bool:
+        """Whether the summary tables are empty while there are results, e.g. after a --no-summaries run."""
+        return not await self._queries.get_summary_networks(self._conn) \
+            and bool(await self._queries.count_evm_properties(self._conn))
+
+    @locked("_lock")
+    async def get_summary(self) -> Dict[str, Any]:
+        """The summary tables: totals per category and per network and category."""
+        totals, networks, updated_at = {}, {}, 0
+        for category, count, total, stamp in await self._queries.get_summary_totals(self._conn):
+            totals[category] = {"address_count": count, "total_wei": total}
+            updated_at = max(updated_at, stamp)
+        for network, category, count, total in await self._queries.get_summary_networks(self._conn):
+            networks.setdefault(network, {})[category] = {"address_count": count, "total_wei": total}
+        return {"totals": totals, "networks": networks, "updated_at": updated_at}
+
+    async def iter_export(self, name: str) -> AsyncIterator[Tuple]:
+        """
+        Stream the rows of an export_* query. Not locked, exports run while
+        nothing else is writing.
+        """
+        async with getattr(self._queries, f"export_{name}_cursor")(self._conn) as cur:
+            async for row in cur:
+                yield row
+
+    async def iter_query(self, name: str, **params) -> AsyncIterator[Tuple]:
+        """Stream the rows of a query_* query, the query command's lookups. Not locked either."""
+        async with getattr(self._queries, f"query_{name}_cursor")(self._conn, **params) as cur:
+            async for row in cur:
+                yield row
+
+    async def add_address(self, network: str, address: str, source: str) -> int:
+        # the id is needed by the caller, so wait for the writer to insert it
+        future = asyncio.get_running_loop().create_future()
+        await self._write_queue.put(("address", {
+            "network": network,
+            "address": address,
+            "source": source,
+        }, future))
+        return await future
+
+    async def save_evm_properties(self, address_id: int, properties: Dict[str, Any]):
+        await self._write_queue.put(("evm_properties", {
+            "address_id": address_id,
+            "native_balance": properties.get('native_balance'),
+            "is_eoa": properties.get('is_eoa'),
+            "is_safe": properties.get('is_safe'),
+            "fetched_at": int(time.time()),
+            "snapshot_id": properties.get('snapshot_id'),
+        }, None))
+
     async def save_safe_wallet_data(self, safe_address_id: int, owners: List[str], safe_wallet_data: Dict[str, Any]):
-        await self._queries.upsert_safe_wallet(
-            self._conn,
-            address_id=safe_address_id,
-            threshold=safe_wallet_data.get('threshold'),
-            nonce=safe_wallet_data.get('nonce'),
-            owner_count=len(owners) if owners else None
-        )
+        await self._write_queue.put(("safe_wallet", {
+            "address_id": safe_address_id,
+            "threshold": safe_wallet_data.get('threshold'),
+            "nonce": safe_wallet_data.get('nonce'),
+            "owner_count": len(owners) if owners else None,
+            "fetched_at": int(time.time()),
+            "snapshot_id": safe_wallet_data.get('snapshot_id'),
+            "owners": owners or [],
+        }, None))
 
-        for owner in owners:
-            await self._queries.insert_safe_wallet_owner(
-                self._conn,
-                safe_address_id=safe_address_id,
-                owner_address=owner
-            )
-        await self._conn.commit()
+    async def save_token_balances(self, address_id: int, balances: Dict[str, str], snapshot_id: int | None = None):
+        await self._write_queue.put(("token_balances", {
+            "address_id": address_id,
+            "balances": balances,
+            "fetched_at": int(time.time()),
+            "snapshot_id": snapshot_id,
+        }, None))
+
+    async def _writer(self):
+        while True:
+            batch = [await self._write_queue.get()]
+            deadline = time.monotonic() + self._batch_interval
+            while len(batch) < self._batch_size:
+                if not self._write_queue.empty():
+                    batch.append(self._write_queue.get_nowait())
+                    continue
+
+                # a worker waiting on an address id shouldn't wait out the window
+                timeout = deadline - time.monotonic()
+                if timeout <= 0 or any(future for _, _, future in batch):
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._write_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            WRITE_QUEUE_DEPTH.set(self._write_queue.qsize())
+            try:
+                await self._write_batch(batch)
+            except Exception as e:
+                logger.error(f"Failed to commit batch of {len(batch)} records: {e}", exc_info=True)
+                for _, _, future in batch:
+                    if future and not future.done():
+                        future.set_exception(e)
+            finally:
+                for _ in batch:
+                    self._write_queue.task_done()
+
+    @locked("_lock")
+    async def _write_batch(self, batch):
+        # one executemany per kind of record, every statement awaited is a
+        # round trip to the connection thread
+        addresses = [(params, future) for kind, params, future in batch if kind == "address"]
+        evm_rows = [params for kind, params, _ in batch if kind == "evm_properties"]
+        safe_rows = [params for kind, params, _ in batch if kind == "safe_wallet"]
+        owner_rows = [
+            {"safe_address_id": params["address_id"], "owner_address": owner}
+            for params in safe_rows
+            for owner in params["owners"]
+        ]
+        token_scans = [params for kind, params, _ in batch if kind == "token_balances"]
+        token_rows = [
+            {
+                "address_id": params["address_id"],
+                "token_address": token,
+                "balance": balance,
+                "fetched_at": params["fetched_at"],
+                "snapshot_id": params["snapshot_id"],
+            }
+            for params in token_scans
+            for token, balance in params["balances"].items()
+        ]
+
+        start = time.perf_counter()
+        try:
+            history = None
+            if self._monitor:
+                evm_rows, safe_rows, owner_rows, history = await self._changes(evm_rows, safe_rows)
+
+            if addresses:
+                await self._queries.insert_addresses(self._conn, [params for params, _ in addresses])
+                rows = await self._queries.get_address_ids(
+                    self._conn,
+                    pairs=json.dumps([[params["network"], params["address"]] for params, _ in addresses])
+                )
+                ids = {(network, address): address_id for network, address, address_id in rows}
+                address_ids = [ids[(params["network"], params["address"])] for params, _ in addresses]
+            summary_state = None
+            if self._summaries and evm_rows:
+                summary_state = await self._summaries.stored_state(self._conn, evm_rows)
+            if evm_rows:
+                await self._queries.upsert_evm_properties(self._conn, evm_rows)
+            if safe_rows:
+                await self._queries.upsert_safe_wallets(self._conn, safe_rows)
+            if owner_rows:
+                await self._queries.insert_safe_wallet_owners(self._conn, owner_rows)
+            if token_scans:
+                # a scan replaces the address' holdings
+                await self._queries.delete_token_balances(
+                    self._conn, [{"address_id": params["address_id"]} for params in token_scans])
+                if token_rows:
+                    await self._queries.insert_token_balances(self._conn, token_rows)
+            if history:
+                await self._write_history(history)
+            if self._summaries and (evm_rows or safe_rows):
+                owners = {row["owner_address"] for row in owner_rows}
+                if history:
+                    owners |= {row["owner_address"] for row in history["removed_owners"]}
+                await self._summaries.apply(self._conn, summary_state or {}, evm_rows,
+                                            [row["address_id"] for row in safe_rows], owners)
+            with COMMIT_SECONDS.time():
+                await self._conn.commit()
+        except Exception:
+            await self._conn.rollback()
+            if self._summaries:
+                # the in-memory totals may include the rolled back rows
+                await self._summaries.load(self._conn)
+            raise
+        # resolved only once committed: a rolled back id fails its future in _writer instead
+        if addresses:
+            for (_, future), address_id in zip(addresses, address_ids):
+                if not future.done():
+                    future.set_result(address_id)
+        TRANSACTION_SECONDS.observe(time.perf_counter() - start)
+        BATCH_RECORDS.observe(len(batch))
+        logger.debug(f"Committed batch of {len(batch)} records")
+
+    async def _changes(self, evm_rows, safe_rows):
+        """
+        Compare the batch against the stored state and keep only what changed:
+        the rows to upsert, the owners to add, and the history to append.
+        A None value is an unknown, not a change, as in the upserts.
+        """
+        evm_ids = json.dumps([row["address_id"] for row in evm_rows])
+        safe_ids = json.dumps([row["address_id"] for row in safe_rows])
+        stored_evm = {
+            address_id: {"native_balance": balance, "is_eoa": is_eoa, "is_safe": is_safe}
+            for address_id, balance, is_eoa, is_safe in await self._queries.get_evm_properties_by_ids(self._conn, ids=evm_ids)
+        }
+        stored_safes = {
+            address_id: {"threshold": threshold, "nonce": nonce, "owner_count": owner_count}
+            for address_id, threshold, nonce, owner_count in await self._queries.get_safe_wallets_by_ids(self._conn, ids=safe_ids)
+        }
+        stored_owners: Dict[int, Set[str]] = {}
+        for safe_address_id, owner in await self._queries.get_safe_wallet_owners_by_ids(self._conn, ids=safe_ids):
+            stored_owners.setdefault(safe_address_id, set()).add(owner)
+
+        history = {"evm": [], "safe": [], "owners": [], "removed_owners": []}
+        changed_evm = []
+        for row in evm_rows:
+            if self._merge(stored_evm, row, ("native_balance", "is_eoa", "is_safe")):
+                changed_evm.append(row)
+                history["evm"].append({**stored_evm[row["address_id"]], **self._stamp(row)})
+
+        changed_safes, added_owners = [], []
+        for row in safe_rows:
+            if self._merge(stored_safes, row, ("threshold", "nonce", "owner_count")):
+                changed_safes.append(row)
+                history["safe"].append({**stored_safes[row["address_id"]], **self._stamp(row)})
+
+            # an empty list is a failed getOwners(), not a Safe without owners
+            if not row["owners"]:
+                continue
+            before = stored_owners.get(row["address_id"], set())
+            after = set(row["owners"])
+            stored_owners[row["address_id"]] = after
+            stamp = {"safe_address_id": row["address_id"], "fetched_at": row["fetched_at"], "snapshot_id": row["snapshot_id"]}
+            for owner in sorted(after - before):
+                history["owners"].append({**stamp, "owner_address": owner, "change": "added"})
+                added_owners.append({"safe_address_id": row["address_id"], "owner_address": owner})
+            for owner in sorted(before - after):
+                history["owners"].append({**stamp, "owner_address": owner, "change": "removed"})
+                history["removed_owners"].append({"safe_address_id": row["address_id"], "owner_address": owner})
+
+        logger.debug(f"Monitor: {len(changed_evm)}/{len(evm_rows)} EVM rows and "
+                     f"{len(changed_safes)}/{len(safe_rows)} Safe rows changed")
+        return changed_evm, changed_safes, added_owners, history
+
+    @staticmethod
+    def _merge(stored: Dict[int, Dict[str, Any]], row: Dict[str, Any], fields) -> bool:
+        """Apply the row's known values to the stored state, returning whether any changed."""
+        current = stored.get(row["address_id"])
+        if current is None:
+            stored[row["address_id"]] = {field: row[field] for field in fields}
+            return True
+        changed = False
+        for field in fields:
+            if row[field] is not None and row[field] != current[field]:
+                current[field] = row[field]
+                changed = True
+        return changed
+
+    @staticmethod
+    def _stamp(row: Dict[str, Any]) -> Dict[str, Any]:
+        return {"address_id": row["address_id"], "fetched_at": row["fetched_at"], "snapshot_id": row["snapshot_id"]}
+
+    async def _write_history(self, history):
+        if history["evm"]:
+            await self._queries.insert_evm_properties_history(self._conn, history["evm"])
+        if history["safe"]:
+            await self._queries.insert_safe_wallets_history(self._conn, history["safe"])
+        if history["owners"]:
+            await self._queries.insert_safe_wallet_owners_history(self._conn, history["owners"])
+        if history["removed_owners"]:
+            await self._queries.delete_safe_wallet_owners(self._conn, history["removed_owners"])
 
     async def close(self):
+        if self._writer_task:
+            # flush everything still queued before closing the connection
+            await self._write_queue.join()
+            self._writer_task.cancel()
+            await asyncio.gather(self._writer_task, return_exceptions=True)
+            self._writer_task = None
+
         if self._conn:
             logger.info("Closing DB connection")
             await self._conn.close()
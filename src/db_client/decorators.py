@@ -1,11 +1,27 @@
 import functools
+import time
+
+from src.metrics import registry
+
+LOCK_WAIT = registry.histogram(
+    "db_lock_wait_seconds", "Time spent waiting for a DB lock", ("function",))
+LOCK_HELD = registry.histogram(
+    "db_lock_held_seconds", "Time a DB lock was held", ("function",))
 
 def locked(lock_attribute_name: str):
     def decorator(func):
+        name = func.__qualname__
+
         @functools.wraps(func)
         async def wrapper(self, *args, **kwargs):
             lock = getattr(self, lock_attribute_name)
+            start = time.perf_counter()
             async with lock:
-                return await func(self, *args, **kwargs)
+                acquired = time.perf_counter()
+                LOCK_WAIT.observe(acquired - start, function=name)
+                try:
+                    return await func(self, *args, **kwargs)
+                finally:
+                    LOCK_HELD.observe(time.perf_counter() - acquired, function=name)
         return wrapper
     return decorator
@@ -13,7 +13,10 @@ CREATE TABLE IF NOT EXISTS evm_properties (
     native_balance TEXT,
     is_eoa BOOLEAN,
     is_safe BOOLEAN,
-    FOREIGN KEY (address_id) REFERENCES addresses (id)
+    fetched_at INTEGER,
+    snapshot_id INTEGER,
+    FOREIGN KEY (address_id) REFERENCES addresses (id),
+    FOREIGN KEY (snapshot_id) REFERENCES snapshots (id)
 );
 
 -- name: create_safe_wallets_table!
@@ -22,7 +25,10 @@ CREATE TABLE IF NOT EXISTS safe_wallets (
     threshold INTEGER,
     nonce INTEGER,
     owner_count INTEGER,
-    FOREIGN KEY (address_id) REFERENCES addresses (id)
+    fetched_at INTEGER,
+    snapshot_id INTEGER,
+    FOREIGN KEY (address_id) REFERENCES addresses (id),
+    FOREIGN KEY (snapshot_id) REFERENCES snapshots (id)
 );
 
 -- name: create_safe_wallet_owners_table!
@@ -33,32 +39,404 @@ CREATE TABLE IF NOT EXISTS safe_wallet_owners (
     FOREIGN KEY (safe_address_id) REFERENCES addresses (id)
 );
 
--- name: insert_address
+-- name: create_token_balances_table!
+-- nonzero ERC-20 balances as of the address' last scan
+CREATE TABLE IF NOT EXISTS token_balances (
+    address_id INTEGER NOT NULL,
+    token_address TEXT NOT NULL,
+    balance TEXT NOT NULL,
+    fetched_at INTEGER,
+    snapshot_id INTEGER,
+    PRIMARY KEY (address_id, token_address),
+    FOREIGN KEY (address_id) REFERENCES addresses (id),
+    FOREIGN KEY (snapshot_id) REFERENCES snapshots (id)
+) WITHOUT ROWID;
+
+-- name: create_snapshots_table!
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    network TEXT NOT NULL,
+    block_number INTEGER NOT NULL,
+    created_at INTEGER NOT NULL
+);
+
+-- name: insert_snapshot<!
+INSERT INTO snapshots (network, block_number, created_at)
+VALUES (:network, :block_number, :created_at);
+
+-- name: insert_addresses*!
 INSERT INTO addresses (network, address, source)
 VALUES (:network, :address, :source)
-ON CONFLICT(network, address) DO NOTHING
-RETURNING id;
+ON CONFLICT(network, address) DO NOTHING;
 
--- name: get_address_id^
-SELECT id FROM addresses WHERE network = :network AND address = :address;
+-- name: get_address_ids
+-- ids of the given [network, address] pairs
+SELECT a.network, a.address, a.id
+FROM json_each(:pairs) AS p
+JOIN addresses a
+    ON a.network = json_extract(p.value, '$[0]')
+    AND a.address = json_extract(p.value, '$[1]');
 
--- name: upsert_evm_properties!
-INSERT INTO evm_properties (address_id, native_balance, is_eoa, is_safe)
-VALUES (:address_id, :native_balance, :is_eoa, :is_safe)
+-- name: upsert_evm_properties*!
+INSERT INTO evm_properties (address_id, native_balance, is_eoa, is_safe, fetched_at, snapshot_id)
+VALUES (:address_id, :native_balance, :is_eoa, :is_safe, :fetched_at, :snapshot_id)
 ON CONFLICT(address_id) DO UPDATE SET
     native_balance = COALESCE(excluded.native_balance, native_balance),
     is_eoa = COALESCE(excluded.is_eoa, is_eoa),
-    is_safe = COALESCE(excluded.is_safe, is_safe);
+    is_safe = COALESCE(excluded.is_safe, is_safe),
+    fetched_at = excluded.fetched_at,
+    snapshot_id = excluded.snapshot_id;
 
--- name: upsert_safe_wallet!
-INSERT INTO safe_wallets (address_id, threshold, nonce, owner_count)
-VALUES (:address_id, :threshold, :nonce, :owner_count)
+-- name: upsert_safe_wallets*!
+INSERT INTO safe_wallets (address_id, threshold, nonce, owner_count, fetched_at, snapshot_id)
+VALUES (:address_id, :threshold, :nonce, :owner_count, :fetched_at, :snapshot_id)
 ON CONFLICT(address_id) DO UPDATE SET
     threshold = COALESCE(excluded.threshold, threshold),
     nonce = COALESCE(excluded.nonce, nonce),
-    owner_count = COALESCE(excluded.owner_count, owner_count);
+    owner_count = COALESCE(excluded.owner_count, owner_count),
+    fetched_at = excluded.fetched_at,
+    snapshot_id = excluded.snapshot_id;
 
--- name: insert_safe_wallet_owner!
+-- name: insert_safe_wallet_owners*!
 INSERT INTO safe_wallet_owners (safe_address_id, owner_address)
 VALUES (:safe_address_id, :owner_address)
 ON CONFLICT(safe_address_id, owner_address) DO NOTHING;
+
+-- name: delete_token_balances*!
+-- tokens no longer held drop out when an address is scanned again
+DELETE FROM token_balances WHERE address_id = :address_id;
+
+-- name: insert_token_balances*!
+INSERT INTO token_balances (address_id, token_address, balance, fetched_at, snapshot_id)
+VALUES (:address_id, :token_address, :balance, :fetched_at, :snapshot_id);
+
+-- name: get_fresh_addresses
+-- Of the given [network, address] pairs, those with results fetched at or after :cutoff
+SELECT a.network, a.address
+FROM json_each(:pairs) AS p
+JOIN addresses a
+    ON a.network = json_extract(p.value, '$[0]')
+    AND a.address = json_extract(p.value, '$[1]')
+JOIN evm_properties ep ON ep.address_id = a.id
+LEFT JOIN safe_wallets sw ON sw.address_id = a.id
+WHERE ep.fetched_at >= :cutoff
+    AND (NOT ep.is_safe OR sw.fetched_at >= :cutoff);
+
+-- name: create_evm_properties_history_table!
+-- every change of an address' EVM properties, written with --monitor
+CREATE TABLE IF NOT EXISTS evm_properties_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    address_id INTEGER NOT NULL,
+    native_balance TEXT,
+    is_eoa BOOLEAN,
+    is_safe BOOLEAN,
+    fetched_at INTEGER NOT NULL,
+    snapshot_id INTEGER,
+    FOREIGN KEY (address_id) REFERENCES addresses (id),
+    FOREIGN KEY (snapshot_id) REFERENCES snapshots (id)
+);
+
+-- name: create_safe_wallets_history_table!
+CREATE TABLE IF NOT EXISTS safe_wallets_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    address_id INTEGER NOT NULL,
+    threshold INTEGER,
+    nonce INTEGER,
+    owner_count INTEGER,
+    fetched_at INTEGER NOT NULL,
+    snapshot_id INTEGER,
+    FOREIGN KEY (address_id) REFERENCES addresses (id),
+    FOREIGN KEY (snapshot_id) REFERENCES snapshots (id)
+);
+
+-- name: create_safe_wallet_owners_history_table!
+-- owners added to or removed from a Safe's owner set
+CREATE TABLE IF NOT EXISTS safe_wallet_owners_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    safe_address_id INTEGER NOT NULL,
+    owner_address TEXT NOT NULL,
+    change TEXT NOT NULL CHECK (change IN ('added', 'removed')),
+    fetched_at INTEGER NOT NULL,
+    snapshot_id INTEGER,
+    FOREIGN KEY (safe_address_id) REFERENCES addresses (id),
+    FOREIGN KEY (snapshot_id) REFERENCES snapshots (id)
+);
+
+-- name: create_history_indexes#
+CREATE INDEX IF NOT EXISTS idx_evm_properties_history_snapshot ON evm_properties_history (snapshot_id);
+CREATE INDEX IF NOT EXISTS idx_evm_properties_history_fetched_at ON evm_properties_history (fetched_at);
+CREATE INDEX IF NOT EXISTS idx_safe_wallets_history_snapshot ON safe_wallets_history (snapshot_id);
+CREATE INDEX IF NOT EXISTS idx_safe_wallets_history_fetched_at ON safe_wallets_history (fetched_at);
+CREATE INDEX IF NOT EXISTS idx_safe_wallet_owners_history_snapshot ON safe_wallet_owners_history (snapshot_id);
+CREATE INDEX IF NOT EXISTS idx_safe_wallet_owners_history_fetched_at ON safe_wallet_owners_history (fetched_at);
+
+-- name: get_evm_properties_by_ids
+SELECT ep.address_id, ep.native_balance, ep.is_eoa, ep.is_safe
+FROM json_each(:ids) AS i
+JOIN evm_properties ep ON ep.address_id = i.value;
+
+-- name: get_safe_wallets_by_ids
+SELECT sw.address_id, sw.threshold, sw.nonce, sw.owner_count
+FROM json_each(:ids) AS i
+JOIN safe_wallets sw ON sw.address_id = i.value;
+
+-- name: get_safe_wallet_owners_by_ids
+SELECT swo.safe_address_id, swo.owner_address
+FROM json_each(:ids) AS i
+JOIN safe_wallet_owners swo ON swo.safe_address_id = i.value;
+
+-- name: insert_evm_properties_history*!
+INSERT INTO evm_properties_history (address_id, native_balance, is_eoa, is_safe, fetched_at, snapshot_id)
+VALUES (:address_id, :native_balance, :is_eoa, :is_safe, :fetched_at, :snapshot_id);
+
+-- name: insert_safe_wallets_history*!
+INSERT INTO safe_wallets_history (address_id, threshold, nonce, owner_count, fetched_at, snapshot_id)
+VALUES (:address_id, :threshold, :nonce, :owner_count, :fetched_at, :snapshot_id);
+
+-- name: insert_safe_wallet_owners_history*!
+INSERT INTO safe_wallet_owners_history (safe_address_id, owner_address, change, fetched_at, snapshot_id)
+VALUES (:safe_address_id, :owner_address, :change, :fetched_at, :snapshot_id);
+
+-- name: delete_safe_wallet_owners*!
+DELETE FROM safe_wallet_owners
+WHERE safe_address_id = :safe_address_id AND owner_address = :owner_address;
+
+-- name: get_changes_since_block
+-- Changes recorded on :network at snapshots after block :block_number, oldest first
+SELECT a.network, a.address, h.kind, h.detail, h.fetched_at, s.block_number
+FROM (
+    SELECT address_id, 'evm_properties' AS kind,
+        json_object('native_balance', native_balance, 'is_eoa', is_eoa, 'is_safe', is_safe) AS detail,
+        fetched_at, snapshot_id
+    FROM evm_properties_history
+    UNION ALL
+    SELECT address_id, 'safe_wallet',
+        json_object('threshold', threshold, 'nonce', nonce, 'owner_count', owner_count),
+        fetched_at, snapshot_id
+    FROM safe_wallets_history
+    UNION ALL
+    SELECT safe_address_id, 'owner_' || change, json_object('owner', owner_address),
+        fetched_at, snapshot_id
+    FROM safe_wallet_owners_history
+) AS h
+JOIN snapshots s ON s.id = h.snapshot_id
+JOIN addresses a ON a.id = h.address_id
+WHERE s.network = :network AND s.block_number > :block_number
+ORDER BY s.block_number, h.fetched_at;
+
+-- name: get_changes_since_time
+-- Changes recorded at or after :since (unix time), on :network or on every network, oldest first
+SELECT a.network, a.address, h.kind, h.detail, h.fetched_at, s.block_number
+FROM (
+    SELECT address_id, 'evm_properties' AS kind,
+        json_object('native_balance', native_balance, 'is_eoa', is_eoa, 'is_safe', is_safe) AS detail,
+        fetched_at, snapshot_id
+    FROM evm_properties_history
+    WHERE fetched_at >= :since
+    UNION ALL
+    SELECT address_id, 'safe_wallet',
+        json_object('threshold', threshold, 'nonce', nonce, 'owner_count', owner_count),
+        fetched_at, snapshot_id
+    FROM safe_wallets_history
+    WHERE fetched_at >= :since
+    UNION ALL
+    SELECT safe_address_id, 'owner_' || change, json_object('owner', owner_address),
+        fetched_at, snapshot_id
+    FROM safe_wallet_owners_history
+    WHERE fetched_at >= :since
+) AS h
+JOIN addresses a ON a.id = h.address_id
+LEFT JOIN snapshots s ON s.id = h.snapshot_id
+WHERE :network IS NULL OR a.network = :network
+ORDER BY h.fetched_at;
+
+-- name: create_indexes#
+-- lookups by owner or by bare address, as done by the dashboard
+CREATE INDEX IF NOT EXISTS idx_safe_wallet_owners_owner ON safe_wallet_owners (owner_address);
+CREATE INDEX IF NOT EXISTS idx_addresses_address ON addresses (address);
+-- the export's and the dashboard's order, largest balance first
+CREATE INDEX IF NOT EXISTS idx_evm_properties_balance ON evm_properties (length(native_balance), native_balance, address_id);
+-- Safes only, for the query command's top Safes without a scan of every address
+CREATE INDEX IF NOT EXISTS idx_evm_properties_safe_balance ON evm_properties (length(native_balance), native_balance)
+WHERE is_safe = 1;
+
+-- name: create_summary_tables#
+-- materialized for the dashboard, kept up to date by the DB writer;
+-- wei amounts are decimal strings, too large for SQLite integers
+CREATE TABLE IF NOT EXISTS summary_networks (
+    network TEXT NOT NULL,
+    category TEXT NOT NULL,
+    address_count INTEGER NOT NULL,
+    total_wei TEXT NOT NULL,
+    PRIMARY KEY (network, category)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS summary_totals (
+    category TEXT PRIMARY KEY,
+    address_count INTEGER NOT NULL,
+    total_wei TEXT NOT NULL,
+    updated_at INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS owner_portfolios (
+    owner_address TEXT PRIMARY KEY,
+    safe_count INTEGER NOT NULL,
+    total_wei TEXT NOT NULL,
+    updated_at INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_owner_portfolios_total ON owner_portfolios (length(total_wei), total_wei, owner_address);
+
+-- name: get_summary_networks
+SELECT network, category, address_count, total_wei FROM summary_networks;
+
+-- name: count_evm_properties$
+SELECT count(*) FROM evm_properties;
+
+-- name: get_summary_state_by_ids
+-- stored state of the given address ids, has_properties is 0 before their first result
+SELECT a.id, a.network, ep.address_id IS NOT NULL, ep.native_balance, ep.is_eoa, ep.is_safe
+FROM json_each(:ids) AS i
+JOIN addresses a ON a.id = i.value
+LEFT JOIN evm_properties ep ON ep.address_id = a.id;
+
+-- name: get_all_summary_states
+SELECT a.network, ep.native_balance, ep.is_eoa, ep.is_safe
+FROM evm_properties ep
+JOIN addresses a ON a.id = ep.address_id;
+
+-- name: upsert_summary_networks*!
+INSERT INTO summary_networks (network, category, address_count, total_wei)
+VALUES (:network, :category, :address_count, :total_wei)
+ON CONFLICT(network, category) DO UPDATE SET
+    address_count = excluded.address_count,
+    total_wei = excluded.total_wei;
+
+-- name: upsert_summary_totals*!
+INSERT INTO summary_totals (category, address_count, total_wei, updated_at)
+VALUES (:category, :address_count, :total_wei, :updated_at)
+ON CONFLICT(category) DO UPDATE SET
+    address_count = excluded.address_count,
+    total_wei = excluded.total_wei,
+    updated_at = excluded.updated_at;
+
+-- name: clear_summaries#
+DELETE FROM summary_networks;
+DELETE FROM summary_totals;
+DELETE FROM owner_portfolios;
+
+-- name: get_owners_of_safes
+SELECT DISTINCT swo.owner_address
+FROM json_each(:ids) AS i
+JOIN safe_wallet_owners swo ON swo.safe_address_id = i.value;
+
+-- name: get_owner_safe_balances
+-- native balance of every Safe each of the given owners is an owner of
+SELECT swo.owner_address, ep.native_balance
+FROM json_each(:owners) AS o
+JOIN safe_wallet_owners swo ON swo.owner_address = o.value
+JOIN evm_properties ep ON ep.address_id = swo.safe_address_id
+WHERE ep.is_safe = 1;
+
+-- name: get_all_owner_safe_balances
+-- grouped by owner through idx_safe_wallet_owners_owner, so portfolios can be written as they complete
+SELECT swo.owner_address, ep.native_balance
+FROM safe_wallet_owners swo
+JOIN evm_properties ep ON ep.address_id = swo.safe_address_id
+WHERE ep.is_safe = 1
+ORDER BY swo.owner_address;
+
+-- name: upsert_owner_portfolios*!
+INSERT INTO owner_portfolios (owner_address, safe_count, total_wei, updated_at)
+VALUES (:owner_address, :safe_count, :total_wei, :updated_at)
+ON CONFLICT(owner_address) DO UPDATE SET
+    safe_count = excluded.safe_count,
+    total_wei = excluded.total_wei,
+    updated_at = excluded.updated_at;
+
+-- name: delete_owner_portfolios*!
+DELETE FROM owner_portfolios WHERE owner_address = :owner_address;
+
+-- name: get_summary_totals
+SELECT category, address_count, total_wei, updated_at FROM summary_totals;
+
+-- name: export_addresses
+-- by balance, largest first: decimal strings compare as numbers once equally long
+SELECT a.network, a.address, ep.native_balance, ep.is_eoa, ep.is_safe, sw.threshold, sw.owner_count
+FROM evm_properties ep
+JOIN addresses a ON a.id = ep.address_id
+LEFT JOIN safe_wallets sw ON sw.address_id = ep.address_id
+ORDER BY length(ep.native_balance) DESC, ep.native_balance DESC, ep.address_id DESC;
+
+-- name: export_owner_portfolios
+SELECT owner_address, safe_count, total_wei
+FROM owner_portfolios
+ORDER BY length(total_wei) DESC, total_wei DESC, owner_address DESC;
+
+-- name: export_safe_owners
+SELECT a.network, a.address, swo.owner_address
+FROM safe_wallet_owners swo
+JOIN addresses a ON a.id = swo.safe_address_id
+ORDER BY a.address, a.network, swo.owner_address;
+
+-- name: query_owner_safes
+-- the query command's reverse lookups stream these; amounts compare as
+-- decimal strings, by length first
+SELECT swo.owner_address, a.network, a.address, ep.native_balance, sw.threshold, sw.owner_count
+FROM json_each(:owners) AS o
+JOIN safe_wallet_owners swo ON swo.owner_address = o.value
+JOIN addresses a ON a.id = swo.safe_address_id
+LEFT JOIN evm_properties ep ON ep.address_id = a.id
+LEFT JOIN safe_wallets sw ON sw.address_id = a.id
+WHERE :network IS NULL OR a.network = :network
+ORDER BY swo.owner_address, a.network, a.address;
+
+-- name: query_safe_owners
+SELECT a.network, a.address, swo.owner_address
+FROM json_each(:safes) AS s
+JOIN addresses a ON a.address = s.value
+JOIN safe_wallet_owners swo ON swo.safe_address_id = a.id
+WHERE :network IS NULL OR a.network = :network
+ORDER BY a.address, a.network, swo.owner_address;
+
+-- name: query_top_balances
+SELECT a.network, a.address, ep.native_balance, ep.is_eoa, ep.is_safe, sw.threshold, sw.owner_count
+FROM evm_properties ep
+JOIN addresses a ON a.id = ep.address_id
+LEFT JOIN safe_wallets sw ON sw.address_id = ep.address_id
+-- the length bound alone is what the index range scan can use
+WHERE length(ep.native_balance) >= length(:min_wei)
+  AND (length(ep.native_balance), ep.native_balance) >= (length(:min_wei), :min_wei)
+  AND (:network IS NULL OR a.network = :network)
+  AND (:kind IS NULL OR CASE WHEN ep.is_safe THEN 'safe' WHEN ep.is_eoa THEN 'eoa' ELSE 'contract' END = :kind)
+ORDER BY length(ep.native_balance) DESC, ep.native_balance DESC, ep.address_id DESC
+LIMIT :limit;
+
+-- name: query_top_safes
+SELECT a.network, a.address, ep.native_balance, ep.is_eoa, ep.is_safe, sw.threshold, sw.owner_count
+FROM evm_properties ep
+JOIN addresses a ON a.id = ep.address_id
+LEFT JOIN safe_wallets sw ON sw.address_id = ep.address_id
+WHERE ep.is_safe = 1
+  AND length(ep.native_balance) >= length(:min_wei)
+  AND (length(ep.native_balance), ep.native_balance) >= (length(:min_wei), :min_wei)
+  AND (:network IS NULL OR a.network = :network)
+  AND (:threshold IS NULL OR sw.threshold = :threshold)
+ORDER BY length(ep.native_balance) DESC, ep.native_balance DESC, ep.address_id DESC
+LIMIT :limit;
+
+-- name: query_cluster_safes
+-- Safes of the given owners, or the given Safes themselves, one step of the cluster walk
+SELECT a.id, a.network, a.address
+FROM json_each(:owners) AS o
+JOIN safe_wallet_owners swo ON swo.owner_address = o.value
+JOIN addresses a ON a.id = swo.safe_address_id
+WHERE :network IS NULL OR a.network = :network
+UNION
+SELECT a.id, a.network, a.address
+FROM json_each(:safes) AS s
+JOIN addresses a ON a.address = s.value
+JOIN evm_properties ep ON ep.address_id = a.id
+WHERE ep.is_safe = 1 AND (:network IS NULL OR a.network = :network);
+
+-- name: query_cluster_owners
+SELECT swo.safe_address_id, swo.owner_address
+FROM json_each(:ids) AS i
+JOIN safe_wallet_owners swo ON swo.safe_address_id = i.value;
@@ -0,0 +1,131 @@
+import asyncio
+import itertools
+import logging
+import threading
+from typing import Dict, Any, List, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# DBClient methods a shard process may call on the parent's instance
+REMOTE_CALLS = {
+    "add_address", "get_fresh_addresses", "create_snapshot",
+    "save_evm_properties", "save_safe_wallet_data", "save_token_balances",
+}
+
+class RemoteDBClient:
+    """
+    DBClient stand-in for shard processes: every call is sent to the parent
+    process, which owns the only SQLite connection (see serve_db_requests).
+    Writes that return nothing are fire-and-forget, like DBClient's.
+    """
+    def __init__(self, shard: int, requests, responses):
+        self._shard = shard
+        self._requests = requests
+        self._responses = responses
+        self._ids = itertools.count()
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._loop = None
+        self._reader = None
+
+    async def connect(self):
+        if self._reader:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._reader = threading.Thread(target=self._read_responses, name=f"db-responses-{self._shard}", daemon=True)
+        self._reader.start()
+
+    async def create_snapshot(self, network: str, block_number: int) -> int:
+        return await self._call("create_snapshot", network, block_number)
+
+    async def get_fresh_addresses(self, pairs: List[Tuple[str, str]], max_age: int | None) -> Set[Tuple[str, str]]:
+        return await self._call("get_fresh_addresses", pairs, max_age)
+
+    async def add_address(self, network: str, address: str, source: str) -> int:
+        return await self._call("add_address", network, address, source)
+
+    async def save_evm_properties(self, address_id: int, properties: Dict[str, Any]):
+        self._requests.put((self._shard, None, "save_evm_properties", (address_id, properties)))
+
+    async def save_safe_wallet_data(self, safe_address_id: int, owners: List[str], safe_wallet_data: Dict[str, Any]):
+        self._requests.put((self._shard, None, "save_safe_wallet_data", (safe_address_id, owners, safe_wallet_data)))
+
+    async def save_token_balances(self, address_id: int, balances: Dict[str, str], snapshot_id: int | None = None):
+        self._requests.put((self._shard, None, "save_token_balances", (address_id, balances, snapshot_id)))
+
+    async def _call(self, method: str, *args):
+        await self.connect()
+        call_id = next(self._ids)
+        future = self._loop.create_future()
+        self._pending[call_id] = future
+        self._requests.put((self._shard, call_id, method, args))
+        return await future
+
+    def _read_responses(self):
+        while True:
+            message = self._responses.get()
+            if message is None:
+                break
+            self._loop.call_soon_threadsafe(self._resolve, *message)
+
+    def _resolve(self, call_id: int, ok: bool, value):
+        future = self._pending.pop(call_id, None)
+        if future is None or future.done():
+            return
+        if ok:
+            future.set_result(value)
+        else:
+            future.set_exception(RuntimeError(value))
+
+    async def close(self):
+        # the parent stops the response reader once every shard has exited
+        for future in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+
+async def serve_db_requests(db_client, requests, responses: list):
+    """
+    Run in the parent process: apply the calls RemoteDBClients send on
+    `requests` to `db_client`, answering on the shard's own `responses`
+    queue, until a None message arrives.
+    """
+    loop = asyncio.get_running_loop()
+    tasks = set()
+
+    async def handle(shard: int, call_id: int | None, method: str, args: tuple):
+        try:
+            value = await getattr(db_client, method)(*args)
+        except Exception as e:
+            logger.error(f"DB call {method} from shard {shard} failed: {e}", exc_info=True)
+            if call_id is not None:
+                responses[shard].put((call_id, False, str(e)))
+            return
+        if call_id is not None:
+            responses[shard].put((call_id, True, value))
+
+    def dispatch(message):
+        if message is None:
+            done.set_result(None)
+            return
+        shard, call_id, method, args = message
+        if method not in REMOTE_CALLS:
+            logger.error(f"Unknown DB call {method} from shard {shard}")
+            return
+        # add_address waits on the writer's batch, so calls run concurrently
+        task = asyncio.create_task(handle(shard, call_id, method, args))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    def read_requests():
+        # a blocking reader thread, rather than a thread hop per message
+        while True:
+            message = requests.get()
+            loop.call_soon_threadsafe(dispatch, message)
+            if message is None:
+                break
+
+    done = loop.create_future()
+    threading.Thread(target=read_requests, name="db-requests", daemon=True).start()
+    await done
+    await asyncio.gather(*tasks)
+    for queue in responses:
+        queue.put(None)
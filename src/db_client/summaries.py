@@ -0,0 +1,157 @@
+import json
+import logging
+import time
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+CATEGORIES = ("eoa", "safe", "contract")
+
+def category(is_eoa, is_safe) -> str:
+    # the dashboard's classification: a Safe is also a contract, unknowns are contracts
+    if is_safe:
+        return "safe"
+    return "eoa" if is_eoa else "contract"
+
+class Summaries:
+    """
+    Materialized aggregates for the dashboard, kept in step with the rows
+    the DB writer upserts, in the same transaction:
+
+        summary_networks    address count and total balance per network and category
+        summary_totals      the same across networks, plus an 'all' row
+        owner_portfolios    Safes owned and their total balance per owner
+
+    Balances are summed as Python ints, they overflow SQLite's.
+    """
+    def __init__(self, queries):
+        self._queries = queries
+        # (network, category) -> [address_count, total_wei]
+        self._networks: Dict[Tuple[str, str], List[int]] = {}
+
+    async def load(self, conn):
+        self._networks = {
+            (network, category): [count, int(total)]
+            for network, category, count, total in await self._queries.get_summary_networks(conn)
+        }
+        if not self._networks and await self._queries.count_evm_properties(conn):
+            await self.rebuild(conn)
+
+    async def rebuild(self, conn, chunk_size: int = 1000):
+        """
+        Recompute the tables from every stored row, streamed through cursors:
+        only the per-network totals and a chunk of portfolios are in memory.
+        """
+        logger.info("Rebuilding summary tables")
+        start = time.perf_counter()
+        self._networks = {}
+        async with self._queries.get_all_summary_states_cursor(conn) as cur:
+            async for network, balance, is_eoa, is_safe in cur:
+                self._add(network, balance, is_eoa, is_safe, 1)
+        await self._queries.clear_summaries(conn)
+        await self._write_networks(conn, self._networks)
+
+        updated_at = int(time.time())
+        portfolios: List[Dict[str, Any]] = []
+        owner_count = 0
+        owner, count, total = None, 0, 0
+        async with self._queries.get_all_owner_safe_balances_cursor(conn) as cur:
+            # rows come grouped by owner, a portfolio is complete at the next owner
+            async for row_owner, balance in cur:
+                if row_owner != owner:
+                    if owner is not None:
+                        portfolios.append(
+                            {"owner_address": owner, "safe_count": count, "total_wei": str(total), "updated_at": updated_at})
+                        owner_count += 1
+                    if len(portfolios) >= chunk_size:
+                        await self._queries.upsert_owner_portfolios(conn, portfolios)
+                        portfolios = []
+                    owner, count, total = row_owner, 0, 0
+                count += 1
+                total += int(balance or 0)
+        if owner is not None:
+            portfolios.append({"owner_address": owner, "safe_count": count, "total_wei": str(total), "updated_at": updated_at})
+            owner_count += 1
+        if portfolios:
+            await self._queries.upsert_owner_portfolios(conn, portfolios)
+        await conn.commit()
+        logger.info(f"Rebuilt summaries of {owner_count} owners in {time.perf_counter() - start:.2f}s")
+
+    async def stored_state(self, conn, evm_rows: List[Dict[str, Any]]) -> Dict[int, Tuple]:
+        """Before the upsert: address id -> (network, has_properties, native_balance, is_eoa, is_safe)."""
+        ids = json.dumps(sorted({row["address_id"] for row in evm_rows}))
+        return {
+            address_id: (network, has_properties, balance, is_eoa, is_safe)
+            for address_id, network, has_properties, balance, is_eoa, is_safe
+            in await self._queries.get_summary_state_by_ids(conn, ids=ids)
+        }
+
+    async def apply(self, conn, stored: Dict[int, Tuple], evm_rows: List[Dict[str, Any]],
+                    safe_ids: Iterable[int], owners: Set[str]):
+        """
+        After the upserts: move each address' balance from its old to its new
+        category, then recompute the portfolios of every owner involved.
+        """
+        changed = {}
+        for row in evm_rows:
+            network, has_properties, balance, is_eoa, is_safe = stored[row["address_id"]]
+            if has_properties:
+                self._add(network, balance, is_eoa, is_safe, -1, changed)
+            # merged as the upsert does
+            balance = row["native_balance"] if row["native_balance"] is not None else balance
+            is_eoa = row["is_eoa"] if row["is_eoa"] is not None else is_eoa
+            is_safe = row["is_safe"] if row["is_safe"] is not None else is_safe
+            stored[row["address_id"]] = (network, True, balance, is_eoa, is_safe)
+            self._add(network, balance, is_eoa, is_safe, 1, changed)
+        if changed:
+            await self._write_networks(conn, changed)
+
+        # owners of Safes whose balance or kind may have changed
+        ids = json.dumps(sorted({row["address_id"] for row in evm_rows} | set(safe_ids)))
+        owners = owners | {owner for owner, in await self._queries.get_owners_of_safes(conn, ids=ids)}
+        if owners:
+            await self._update_portfolios(conn, owners)
+
+    def _add(self, network: str, balance, is_eoa, is_safe, sign: int, changed: Dict | None = None):
+        key = (network, category(is_eoa, is_safe))
+        totals = self._networks.setdefault(key, [0, 0])
+        totals[0] += sign
+        totals[1] += sign * int(balance or 0)
+        if changed is not None:
+            changed[key] = totals
+
+    async def _write_networks(self, conn, networks: Dict[Tuple[str, str], List[int]]):
+        if not networks:
+            return
+        await self._queries.upsert_summary_networks(conn, [
+            {"network": network, "category": category, "address_count": count, "total_wei": str(total)}
+            for (network, category), (count, total) in networks.items()
+        ])
+        totals = {name: [0, 0] for name in CATEGORIES + ("all",)}
+        for (_, category), (count, total) in self._networks.items():
+            for name in (category, "all"):
+                totals[name][0] += count
+                totals[name][1] += total
+        updated_at = int(time.time())
+        await self._queries.upsert_summary_totals(conn, [
+            {"category": name, "address_count": count, "total_wei": str(total), "updated_at": updated_at}
+            for name, (count, total) in totals.items()
+        ])
+
+    async def _update_portfolios(self, conn, owners: Set[str]):
+        portfolios = {owner: [0, 0] for owner in owners}
+        for owner, balance in await self._queries.get_owner_safe_balances(conn, owners=json.dumps(sorted(owners))):
+            portfolios[owner][0] += 1
+            portfolios[owner][1] += int(balance or 0)
+
+        updated_at = int(time.time())
+        current = [
+            {"owner_address": owner, "safe_count": count, "total_wei": str(total), "updated_at": updated_at}
+            for owner, (count, total) in portfolios.items() if count
+        ]
+        # no longer an owner of any Safe
+        gone = [{"owner_address": owner} for owner, (count, _) in portfolios.items() if not count]
+        if current:
+            await self._queries.upsert_owner_portfolios(conn, current)
+        if gone:
+            await self._queries.delete_owner_portfolios(conn, gone)
@@ -0,0 +1 @@
+from .exporter import Exporter
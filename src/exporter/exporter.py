@@ -0,0 +1,118 @@
+import json
+import logging
+import os
+import shutil
+import time
+from typing import Any, Dict, List
+
+from src.db_client.summaries import CATEGORIES, category
+
+logger = logging.getLogger(__name__)
+
+ADDRESS_COLUMNS = ["network", "address", "native_balance", "category", "threshold", "owner_count"]
+OWNER_COLUMNS = ["owner_address", "safe_count", "total_wei"]
+
+class Exporter:
+    """
+    Writes the dashboard's data as static JSON files it can lazy-load, in
+    place of the whole SQLite file:
+
+        index.json                      summary tables, columns and page lists
+        addresses/<category>-NNNN.json  rows by balance, largest first, per
+                                        category and for 'all'
+        owners/page-NNNN.json           owner portfolios by total balance
+        safe-owners/<xx>.json           owners of each Safe, by the first
+                                        byte of its address
+
+    Rows are arrays in the order of index.json's columns, wei as decimal strings.
+    """
+    def __init__(self, db_client, directory: str, page_size: int = 1000):
+        self.db_client = db_client
+        self.directory = directory
+        self.page_size = page_size
+
+    async def export(self):
+        start = time.perf_counter()
+        if await self.db_client.summaries_missing():
+            # an export only reads, the next scan with summaries rebuilds them
+            logger.error("The summary tables are empty, run a scan with summaries before exporting")
+            return
+        for subdirectory in ("addresses", "owners", "safe-owners"):
+            # pages left from a larger export would otherwise linger
+            shutil.rmtree(os.path.join(self.directory, subdirectory), ignore_errors=True)
+            os.makedirs(os.path.join(self.directory, subdirectory))
+
+        index = {
+            "version": 1,
+            "generated_at": int(time.time()),
+            "page_size": self.page_size,
+            "summary": await self.db_client.get_summary(),
+            "addresses": {"columns": ADDRESS_COLUMNS, **await self._export_addresses()},
+            "owners": {"columns": OWNER_COLUMNS, **await self._export_owners()},
+            "safe_owners": {"shards": await self._export_safe_owners()},
+        }
+        # written last, a reader never finds a manifest of missing pages
+        self._write("index.json", index)
+        logger.info(f"Exported {index['addresses']['all']['count']} addresses and {index['owners']['count']} owners "
+                    f"to {self.directory} in {time.perf_counter() - start:.2f}s")
+
+    async def _export_addresses(self) -> Dict[str, Any]:
+        # one pass over the ordered rows fills every category's pages
+        pages = {name: _Pages(self, f"addresses/{name}") for name in ("all",) + CATEGORIES}
+        async for network, address, balance, is_eoa, is_safe, threshold, owner_count in self.db_client.iter_export("addresses"):
+            kind = category(is_eoa, is_safe)
+            row = [network, address, balance or "0", kind, threshold, owner_count]
+            pages["all"].add(row)
+            pages[kind].add(row)
+        return {name: page.close() for name, page in pages.items()}
+
+    async def _export_owners(self) -> Dict[str, Any]:
+        pages = _Pages(self, "owners/page")
+        async for owner, safe_count, total_wei in self.db_client.iter_export("owner_portfolios"):
+            pages.add([owner, safe_count, total_wei])
+        return pages.close()
+
+    async def _export_safe_owners(self) -> List[str]:
+        shards, prefix, owners = [], None, {}
+        async for network, address, owner in self.db_client.iter_export("safe_owners"):
+            # rows come by address, so each shard is complete before the next
+            if address[2:4] != prefix:
+                if owners:
+                    shards.append(self._write_shard(prefix, owners))
+                prefix, owners = address[2:4], {}
+            owners.setdefault(f"{network}:{address}", []).append(owner)
+        if owners:
+            shards.append(self._write_shard(prefix, owners))
+        return shards
+
+    def _write_shard(self, prefix: str, owners: Dict[str, List[str]]) -> str:
+        return self._write(f"safe-owners/{prefix}.json", owners)
+
+    def _write(self, name: str, data) -> str:
+        with open(os.path.join(self.directory, name), "w") as f:
+            json.dump(data, f, separators=(",", ":"))
+        return name
+
+class _Pages:
+    """Rows written out in numbered pages as they come."""
+    def __init__(self, exporter: Exporter, prefix: str):
+        self._exporter = exporter
+        self._prefix = prefix
+        self._rows = []
+        self.pages = []
+        self.count = 0
+
+    def add(self, row: list):
+        self._rows.append(row)
+        self.count += 1
+        if len(self._rows) >= self._exporter.page_size:
+            self._flush()
+
+    def close(self) -> Dict[str, Any]:
+        if self._rows:
+            self._flush()
+        return {"count": self.count, "pages": self.pages}
+
+    def _flush(self):
+        self.pages.append(self._exporter._write(f"{self._prefix}-{len(self.pages):04d}.json", self._rows))
+        self._rows = []
@@ -1,31 +1,56 @@
+import asyncio
+import hashlib
 import logging
+from typing import AsyncIterator, Tuple
 
 from src.config import config
 
 logger = logging.getLogger(__name__)
 
 class FileReader:
-    def get_addresses(self):
-        if not config.args or not hasattr(config.args, 'input_file'):
-            return []
+    async def stream_addresses(self, input_file: str | None = None) -> AsyncIterator[Tuple[str, str]]:
+        """
+        Yield (network, address) pairs line by line, skipping duplicates,
+        so processing can start before the whole file is read. Reads
+        `input_file`, or the -f file when not given.
+        """
+        if input_file is None:
+            if not config.args or not getattr(config.args, 'input_file', None):
+                return
+            input_file = config.args.input_file
 
+        # 16-byte digests of the pairs seen so far: smaller than the strings,
+        # and unlike hash() no two different pairs in practice share one
+        seen = set()
+        count = 0
         try:
-            with open(config.args.input_file, 'r') as f:
-                logger.info(f"Reading {config.args.input_file}")
-                lines = [line.strip() for line in f if line.strip()]
-                parsed_data = []
-                for i, line in enumerate(lines):
+            with open(input_file, 'r') as f:
+                logger.info(f"Streaming {input_file}")
+                for i, line in enumerate(f):
+                    line = line.strip()
+                    if not line:
+                        continue
+
                     parts = line.split(' ', 1)
-                    if len(parts) == 2:
-                        network, address = parts
-                        parsed_data.append((network.lower(), address.lower().strip()))
-                    else:
+                    if len(parts) != 2:
                         logger.warning(f"Skipping malformed line at index {i}: '{line}'")
-                logger.info(f"Read {len(parsed_data)} addresses")
-                return parsed_data
+                        continue
+
+                    pair = (parts[0].lower(), parts[1].lower().strip())
+                    key = hashlib.blake2b(f"{pair[0]} {pair[1]}".encode(), digest_size=16).digest()
+                    if key in seen:
+                        logger.debug(f"Skipping duplicate at index {i}: '{line}'")
+                        continue
+                    seen.add(key)
+
+                    count += 1
+                    yield pair
+
+                    # hand control back to the workers every so often
+                    if count % 1000 == 0:
+                        await asyncio.sleep(0)
+                logger.info(f"Read {count} addresses")
         except FileNotFoundError:
-            print(f"Error: The file '{config.args.input_file}' was not found.")
-            return []
+            print(f"Error: The file '{input_file}' was not found.")
         except Exception as e:
             print(f"An error occurred while reading the file: {e}")
-            return []
@@ -0,0 +1,2 @@
+from .metrics import Counter, Gauge, Histogram, Registry, registry
+from .server import MetricsServer
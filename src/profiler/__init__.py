@@ -0,0 +1 @@
+from .profiler import SamplingProfiler
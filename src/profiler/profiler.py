@@ -0,0 +1,240 @@
+import asyncio
+import linecache
+import logging
+import os
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+STDLIB = sysconfig.get_paths()["stdlib"]
+
+# innermost frames of a thread that is waiting, not running
+IDLE_FRAMES = {
+    ("selectors.py", "EpollSelector.select"), ("selectors.py", "KqueueSelector.select"),
+    ("selectors.py", "_PollLikeSelector.select"), ("selectors.py", "SelectSelector.select"),
+    ("threading.py", "Condition.wait"), ("threading.py", "Event.wait"),
+    ("connection.py", "Connection._recv"), ("connection.py", "Connection._poll"),
+}
+# or blocked in a C call such as SimpleQueue.get(), seen from the line it is on
+IDLE_CALLS = (".get()", ".get(block=True)", ".wait(", ".select(")
+IDLE = "[idle]"
+
+class SamplingProfiler:
+    """
+    Samples the Python stack of every thread every `interval` seconds from
+    a background thread. Stacks on the event loop's thread are attributed
+    to the task running at the time, by the coroutine it was created with,
+    and cut at the loop's callback dispatch, so they read as coroutine call
+    chains. Writes collapsed stacks, the input of flamegraph.pl and
+    speedscope, and a text report ranked by subsystem, function and task.
+    """
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._loop = None
+        self._loop_thread = None
+        self._thread = None
+        self._stopping = threading.Event()
+        self._started = 0.0
+        self._elapsed = 0.0
+        # code object -> (label, subsystem, file name, qualified name)
+        self._frames: Dict[object, Tuple[str, str, str, str]] = {}
+        self._idle_lines: Dict[Tuple[object, int], bool] = {}
+
+    def start(self, loop: asyncio.AbstractEventLoop | None = None):
+        self._loop = loop or asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread:
+            self._stopping.set()
+            self._thread.join()
+            self._thread = None
+            self._elapsed = time.perf_counter() - self._started
+
+    def write(self, prefix: str) -> Tuple[str, str]:
+        """Write PREFIX.collapsed and PREFIX.txt, returning their paths."""
+        directory = os.path.dirname(prefix)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        collapsed, report = f"{prefix}.collapsed", f"{prefix}.txt"
+        with open(collapsed, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{';'.join(stack)} {count}\n")
+        with open(report, "w") as f:
+            f.write(self.report())
+        logger.info(f"Wrote profile to {collapsed} and {report}")
+        return collapsed, report
+
+    def _run(self):
+        me = threading.get_ident()
+        # the sampler needs the GIL to take a sample, a shorter switch
+        # interval keeps a busy loop from delaying it
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(switch_interval, self.interval / 5))
+        try:
+            while not self._stopping.wait(self.interval):
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident != me:
+                        self.stacks[self._stack(ident, names.get(ident, str(ident)), frame)] += 1
+                self.samples += 1
+        finally:
+            sys.setswitchinterval(switch_interval)
+
+    def _stack(self, ident: int, thread_name: str, frame) -> Tuple[str, ...]:
+        idle = self._is_idle(frame)
+        codes = []
+        while frame is not None:
+            codes.append(frame.f_code)
+            frame = frame.f_back
+        codes.reverse()
+
+        if ident == self._loop_thread:
+            # asyncio's own frames above the callback being run say nothing
+            for i in range(len(codes) - 1, -1, -1):
+                if codes[i].co_name in ("_run", "_run_once") and codes[i].co_filename.endswith(
+                        ("events.py", "base_events.py")):
+                    codes = codes[i + 1:]
+                    break
+            # private, but a plain dict read: the task the loop is stepping right now
+            task = asyncio.tasks._current_tasks.get(self._loop)
+            root = f"task:{_task_label(task)}" if task is not None else "loop"
+        else:
+            root = f"thread:{thread_name.rstrip('0123456789-_') or thread_name}"
+        stack = (root, *(self._frame(code)[0] for code in codes))
+        return stack + (IDLE,) if idle else stack
+
+    def _is_idle(self, frame) -> bool:
+        key = (frame.f_code, frame.f_lineno)
+        idle = self._idle_lines.get(key)
+        if idle is None:
+            _, _, basename, qualname = self._frame(frame.f_code)
+            line = linecache.getline(frame.f_code.co_filename, frame.f_lineno or 0)
+            idle = self._idle_lines[key] = (basename, qualname) in IDLE_FRAMES or any(call in line for call in IDLE_CALLS)
+        return idle
+
+    def _frame(self, code) -> Tuple[str, str, str, str]:
+        frame = self._frames.get(code)
+        if frame is None:
+            filename = code.co_filename
+            qualname = getattr(code, "co_qualname", code.co_name)
+            frame = self._frames[code] = (
+                f"{qualname} ({_short_path(filename)}:{code.co_firstlineno})",
+                _subsystem(filename),
+                os.path.basename(filename),
+                qualname,
+            )
+        return frame
+
+    def report(self) -> str:
+        labels = {label: (subsystem, basename, qualname)
+                  for label, subsystem, basename, qualname in self._frames.values()}
+        busy = Counter()
+        idle = Counter()
+        self_subsystems, for_subsystems = Counter(), Counter()
+        self_functions, total_functions = Counter(), Counter()
+
+        for (root, *frames), count in self.stacks.items():
+            if not frames or frames[-1] == IDLE:
+                idle[root] += count
+                continue
+            busy[root] += count
+            leaf = labels[frames[-1]]
+            self_subsystems[leaf[0]] += count
+            # the innermost frame of this repo's code is what the time was spent for,
+            # or the library's own, in threads it runs
+            ours = next((labels[f][0] for f in reversed(frames) if labels[f][0] in _OWN_SUBSYSTEMS), leaf[0])
+            for_subsystems[ours] += count
+            self_functions[frames[-1]] += count
+            for label in set(frames):
+                total_functions[label] += count
+
+        total_busy = sum(busy.values()) or 1
+        loop_samples = sum(count for root, count in busy.items() if root == "loop" or root.startswith("task:"))
+        loop_idle = sum(count for root, count in idle.items() if root == "loop" or root.startswith("task:"))
+        lines = [
+            f"{self.samples} samples every {self.interval * 1000:g} ms over {self._elapsed:.2f}s",
+            f"event loop busy in {loop_samples} of {loop_samples + loop_idle} samples"
+            f" ({100 * loop_samples / max(loop_samples + loop_idle, 1):.1f}%)",
+            "",
+            "Busy samples by subsystem",
+            _table(("subsystem", "for", "%", "self", "%"), [
+                (name, for_subsystems[name], _pct(for_subsystems[name], total_busy),
+                 self_subsystems[name], _pct(self_subsystems[name], total_busy))
+                for name in sorted(set(for_subsystems) | set(self_subsystems),
+                                   key=lambda name: (-for_subsystems[name], -self_subsystems[name]))
+            ]),
+            "  for: under that part of this repo, libraries it calls included; self: in its own code only",
+            "",
+            "By task (event loop) and thread",
+            _table(("task/thread", "busy", "%", "idle"), [
+                (root, busy[root], _pct(busy[root], total_busy), idle[root])
+                for root in sorted(set(busy) | set(idle), key=lambda root: (-busy[root], -idle[root]))
+            ]),
+            "",
+            "Top functions by self samples",
+            _table(("function", "subsystem", "self", "%", "total", "%"), [
+                (label, labels[label][0], count, _pct(count, total_busy),
+                 total_functions[label], _pct(total_functions[label], total_busy))
+                for label, count in self_functions.most_common(40)
+            ]),
+            "",
+            "Top functions by total samples",
+            _table(("function", "subsystem", "total", "%"), [
+                (label, labels[label][0], count, _pct(count, total_busy))
+                for label, count in total_functions.most_common(40)
+            ]),
+        ]
+        return "\n".join(lines) + "\n"
+
+_OWN_SUBSYSTEMS = {"rpc_client", "db_client", "address_analyzer", "shard_runner", "service", "metrics",
+                   "exporter", "profiler", "file_reader", "config", "main"}
+
+def _task_label(task) -> str:
+    coro = task.get_coro()
+    return getattr(coro, "__qualname__", None) or task.get_name()
+
+def _short_path(filename: str) -> str:
+    if filename.startswith(ROOT + os.sep):
+        return os.path.relpath(filename, ROOT)
+    marker = f"{os.sep}site-packages{os.sep}"
+    if marker in filename:
+        return filename.split(marker, 1)[1]
+    if filename.startswith(STDLIB):
+        return os.path.relpath(filename, STDLIB)
+    return filename
+
+def _subsystem(filename: str) -> str:
+    """This repo's package, the library, or 'stdlib' a file belongs to."""
+    if filename.startswith(ROOT + os.sep):
+        parts = os.path.relpath(filename, ROOT).split(os.sep)
+        if parts[0] == "src":
+            return parts[1].removesuffix(".py")
+        return "main" if parts[0] == "web3_address_recon.py" else parts[0]
+    marker = f"{os.sep}site-packages{os.sep}"
+    if marker in filename:
+        return filename.split(marker, 1)[1].split(os.sep)[0].removesuffix(".py")
+    if filename.startswith(os.path.join(STDLIB, "asyncio")):
+        return "asyncio"
+    return "stdlib"
+
+def _pct(count: int, total: int) -> str:
+    return f"{100 * count / total:.1f}"
+
+def _table(header: Tuple[str, ...], rows: List[tuple]) -> str:
+    rows = [tuple(str(cell) for cell in row) for row in rows]
+    widths = [max(len(row[i]) for row in rows + [header]) for i in range(len(header))]
+    lines = ["  ".join(cell.ljust(width) for cell, width in zip(header, widths))]
+    lines += ["  ".join(cell.ljust(width) for cell, width in zip(row, widths)) for row in rows]
+    return "\n".join("  " + line.rstrip() for line in lines)
@@ -0,0 +1,131 @@
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Dict, List, Set, TextIO
+
+from src.db_client.summaries import category
+
+logger = logging.getLogger(__name__)
+
+ADDRESS_COLUMNS = ["network", "address", "native_balance", "category", "threshold", "owner_count"]
+
+class QueryRunner:
+    """
+    The query command: reverse lookups over the results database, each an
+    indexed query whose rows are written out as they are read, one JSON
+    object per line or as CSV with a header.
+
+        owner-safes   Safes of each owner, on every network
+        safe-owners   owners of each Safe
+        top-balances  addresses by native balance, largest first
+        cluster       Safes linked to the given addresses through shared owners
+        changes       changes recorded by --monitor runs since a block or a time
+    """
+    def __init__(self, db_client, fmt: str = "jsonl", output: TextIO = sys.stdout):
+        self.db_client = db_client
+        self.fmt = fmt
+        self.output = output
+
+    async def run(self, name: str, args) -> int:
+        start = time.perf_counter()
+        network = args.network
+        if name == "owner-safes":
+            columns = ["owner", "network", "safe", "native_balance", "threshold", "owner_count"]
+            rows = self.db_client.iter_query("owner_safes", owners=_addresses(args.addresses), network=network)
+        elif name == "safe-owners":
+            columns = ["network", "safe", "owner"]
+            rows = self.db_client.iter_query("safe_owners", safes=_addresses(args.addresses), network=network)
+        elif name == "top-balances":
+            columns = ADDRESS_COLUMNS
+            rows = self._top_balances(args.kind, args.min_wei, args.threshold, args.limit, network)
+        elif name == "cluster":
+            columns = ["depth", "network", "safe", "owner"]
+            rows = self._cluster([address.lower() for address in args.addresses], args.max_depth, network)
+        elif name == "changes":
+            columns = ["network", "address", "kind", "detail", "fetched_at", "block_number"]
+            rows = self._changes(network, args.since_block, args.since)
+        else:
+            raise ValueError(f"Unknown query {name}")
+
+        count = await self._write(columns, rows)
+        logger.info(f"Query {name} returned {count} rows in {(time.perf_counter() - start) * 1000:.1f} ms")
+        return count
+
+    async def _top_balances(self, kind: str | None, min_wei: str, threshold: int | None, limit: int,
+                            network: str | None) -> AsyncIterator[List[Any]]:
+        if threshold is not None or kind == "safe":
+            # the Safes' own balance index, rather than a walk over every address
+            rows = self.db_client.iter_query(
+                "top_safes", min_wei=min_wei, threshold=threshold, limit=limit, network=network)
+        else:
+            rows = self.db_client.iter_query("top_balances", min_wei=min_wei, kind=kind, limit=limit, network=network)
+        async with aclosing(rows):
+            async for network, address, balance, is_eoa, is_safe, threshold, owner_count in rows:
+                yield [network, address, balance, category(is_eoa, is_safe), threshold, owner_count]
+
+    async def _cluster(self, addresses: List[str], max_depth: int, network: str | None) -> AsyncIterator[List[Any]]:
+        """
+        Walk from the given owners or Safes to their Safes, those Safes'
+        owners, their other Safes and so on, one indexed lookup per step.
+        """
+        seen_safes: Set[int] = set()
+        seen_owners: Set[str] = set(addresses)
+        owners, safes = addresses, addresses
+        for depth in range(max_depth + 1):
+            found: Dict[int, tuple] = {}
+            async for safe_id, safe_network, safe in self.db_client.iter_query(
+                    "cluster_safes", owners=json.dumps(owners), safes=json.dumps(safes), network=network):
+                if safe_id not in seen_safes:
+                    found[safe_id] = (safe_network, safe)
+            if not found:
+                return
+            seen_safes.update(found)
+
+            owners, safes = [], []
+            async with aclosing(self.db_client.iter_query("cluster_owners", ids=json.dumps(sorted(found)))) as rows:
+                async for safe_id, owner in rows:
+                    yield [depth, *found[safe_id], owner]
+                    if owner not in seen_owners:
+                        seen_owners.add(owner)
+                        owners.append(owner)
+            if not owners:
+                return
+
+    async def _changes(self, network: str | None, block_number: int | None,
+                       since: int | None) -> AsyncIterator[List[Any]]:
+        for change in await self.db_client.get_changes_since(network, block_number, since):
+            # a nested object in JSON lines, JSON text in a CSV cell
+            if self.fmt == "csv":
+                change["detail"] = json.dumps(change["detail"])
+            yield list(change.values())
+
+    async def _write(self, columns: List[str], rows: AsyncIterator) -> int:
+        count = 0
+        try:
+            # closed here, a reader that left early doesn't leave a cursor open past the database
+            async with aclosing(rows):
+                if self.fmt == "csv":
+                    writer = csv.writer(self.output)
+                    writer.writerow(columns)
+                    async for row in rows:
+                        writer.writerow(row)
+                        count += 1
+                else:
+                    async for row in rows:
+                        self.output.write(json.dumps(dict(zip(columns, row))) + "\n")
+                        count += 1
+            self.output.flush()
+        except BrokenPipeError:
+            # the reader went away, e.g. `| head`: stop there, and send what's
+            # left in the buffer to devnull so the flush at exit doesn't fail too
+            os.dup2(os.open(os.devnull, os.O_WRONLY), self.output.fileno())
+            logger.info(f"Output closed after {count} rows")
+        return count
+
+def _addresses(addresses: List[str]) -> str:
+    # stored lowercase, as read from the input and from getOwners()
+    return json.dumps(sorted({address.lower() for address in addresses}))
@@ -1 +1,2 @@
-from .rpc_client import RPCClient
+from .rpc_client import RPCClient, provider_rate_limits
+from .shared_limiter import SharedTokenBucket
@@ -1,86 +1,80 @@
 import logging
-import asyncio
+
 import httpx
-from aiolimiter import AsyncLimiter
 
-from src.config import config
-from .base import RPCClientBase
-from .decorators import alchemy_request
+from .cache import RPCCache
+from .decorators import cached
+from .json_rpc_client import JsonRpcClient
+from .throttle import JsonRpcError
 
 logger = logging.getLogger(__name__)
 
-class AlchemyClient(RPCClientBase):
-    def __init__(self):
-        logger.info("Initializing Alchemy Client")
+class AlchemyClient(JsonRpcClient):
+    # adjust to match your Alchemy plan
+    RATE_LIMIT = 250  # req/sec
+    CONCURRENCY = 50
+    TOKEN_PAGE_SIZE = 100
 
-        self.base_urls = {
-            "arbitrum": f"https://arb-mainnet.g.alchemy.com/v2/{config.ALCHEMY_API_KEY}",
-            "avalanche": f"https://avax-mainnet.g.alchemy.com/v2/{config.ALCHEMY_API_KEY}",
-            "base": f"https://base-mainnet.g.alchemy.com/v2/{config.ALCHEMY_API_KEY}",
-            "bsc": f"https://bnb-mainnet.g.alchemy.com/v2/{config.ALCHEMY_API_KEY}",
-            "ethereum": f"https://eth-mainnet.g.alchemy.com/v2/{config.ALCHEMY_API_KEY}",
-            "linea": f"https://linea-mainnet.g.alchemy.com/v2/{config.ALCHEMY_API_KEY}",
-            "optimism": f"https://opt-mainnet.g.alchemy.com/v2/{config.ALCHEMY_API_KEY}",
-            "polygon": f"https://polygon-mainnet.g.alchemy.com/v2/{config.ALCHEMY_API_KEY}",
-            "sei": f"https://sei-mainnet.g.alchemy.com/v2/{config.ALCHEMY_API_KEY}",
-            "zksync": f"https://zksync-mainnet.g.alchemy.com/v2/{config.ALCHEMY_API_KEY}"
+    def __init__(self, api_key: str, cache: RPCCache | None = None, name: str = "alchemy", rate_limiter=None,
+                 shards: int = 1):
+        base_urls = {
+            "arbitrum": f"https://arb-mainnet.g.alchemy.com/v2/{api_key}",
+            "avalanche": f"https://avax-mainnet.g.alchemy.com/v2/{api_key}",
+            "base": f"https://base-mainnet.g.alchemy.com/v2/{api_key}",
+            "bsc": f"https://bnb-mainnet.g.alchemy.com/v2/{api_key}",
+            "ethereum": f"https://eth-mainnet.g.alchemy.com/v2/{api_key}",
+            "linea": f"https://linea-mainnet.g.alchemy.com/v2/{api_key}",
+            "optimism": f"https://opt-mainnet.g.alchemy.com/v2/{api_key}",
+            "polygon": f"https://polygon-mainnet.g.alchemy.com/v2/{api_key}",
+            "sei": f"https://sei-mainnet.g.alchemy.com/v2/{api_key}",
+            "zksync": f"https://zksync-mainnet.g.alchemy.com/v2/{api_key}"
         }
 
-        # async HTTP client (reused, pooled connections)
-        self._http = httpx.AsyncClient(timeout=10, http2=True)
-
-        # async rate limit: adjust to match your Alchemy plan
-        self._alchemy_rate_limit = AsyncLimiter(250, 1)  # 250 req/sec
-
-        # bound in-flight concurrency to avoid overwhelming the loop/remote
-        self._alchemy_concurrency = asyncio.Semaphore(50)  # ~50 concurrent requests
-
-    async def aclose(self):
-        await self._http.aclose()
-
-    @alchemy_request("eth_getBalance")
-    def get_native_balance(self, network: str, address: str, result: str | None) -> str:
-        if result:
-            return str(int(result, 16))
-        return "0"
+        super().__init__(name, base_urls, cache=cache, rate_limiter=rate_limiter, shards=shards)
 
-    @alchemy_request("eth_getCode")
-    def is_eoa(self, network: str, address: str, result: str | None) -> bool | None:
-        if result:
-            return result == '0x'
-        return None
+    async def get_token_balances(self, network: str, address: str) -> dict[str, str] | None:
+        """
+        Every ERC-20 balance of the address from alchemy_getTokenBalances,
+        a page of up to TOKEN_PAGE_SIZE tokens per call. It only answers at the
+        latest block, so pinned networks and failures use the token list.
+        """
+        if network not in self.base_urls or network in self.blocks:
+            return await super().get_token_balances(network, address)
 
-    # Check for masterCopy() (method signature 0xa619486e),
-    # a good indicator of a Gnosis Safe proxy
-    @alchemy_request("eth_call", params_builder=lambda addr: [{"to": addr, "data": "0xa619486e"}, "latest"])
-    def is_safe(self, network: str, address: str, result: str | None) -> bool | None:
-        return result is not None and result != '0x'
+        balances = {}
+        page_key = None
+        while True:
+            options = {"maxCount": self.TOKEN_PAGE_SIZE}
+            if page_key:
+                options["pageKey"] = page_key
+            params = [address, "erc20", options]
 
-    # Check for getThreshold() (method signature 0xe75235b8)
-    @alchemy_request("eth_call", params_builder=lambda addr: [{"to": addr, "data": "0xe75235b8"}, "latest"])
-    def get_safe_threshold(self, network: str, address: str, result: str | None) -> int | None:
-        if result and result != '0x':
-            return int(result, 16)
-        return None
+            try:
+                result = await cached(
+                    self, network, "alchemy_getTokenBalances", params,
+                    lambda: self._batcher.request(network, "alchemy_getTokenBalances", params)
+                )
+            except JsonRpcError as e:
+                if e.unsupported:
+                    # a network without the endpoint
+                    return await super().get_token_balances(network, address)
+                logger.error("Error during alchemy_getTokenBalances for %s on %s: %s", address, network, e)
+                return None
+            except (httpx.HTTPError, ValueError, KeyError) as e:
+                # unknown, rather than an address without tokens
+                logger.error("Error during alchemy_getTokenBalances for %s on %s: %s", address, network, e)
+                return None
+            if not isinstance(result, dict):
+                return await super().get_token_balances(network, address)
 
-    # Check for nonce() (method signature 0xaffed0e0)
-    @alchemy_request("eth_call", params_builder=lambda addr: [{"to": addr, "data": "0xaffed0e0"}, "latest"])
-    def get_safe_nonce(self, network: str, address: str, result: str | None) -> int | None:
-        if result and result != '0x':
-            return int(result, 16)
-        return None
+            for entry in result.get("tokenBalances") or []:
+                raw = entry.get("tokenBalance")
+                if entry.get("error") or not raw or raw == "0x":
+                    continue
+                value = int(raw, 16)
+                if value:
+                    balances[entry["contractAddress"].lower()] = str(value)
 
-    # Check for getOwners(method signature 0xa0e67e2b)
-    @alchemy_request("eth_call", params_builder=lambda addr: [{"to": addr, "data": "0xa0e67e2b"}, "latest"])
-    def get_safe_owners(self, network: str, address: str, result: str | None) -> list[str] | None:
-        if result and result != '0x':
-            # The result of this call is a hex string of tightly packed addresses.
-            # We skip first the '0x' prefix (2) + 128 hex chars: offset (64) + array length (64)
-            raw_owners = result[130:]
-            owners = []
-            for i in range(0, len(raw_owners), 64):
-                padded_addr = raw_owners[i:i+64]
-                addr_hex = padded_addr[24:64] # The actual address hex (last 40 chars)
-                owners.append(f"0x{addr_hex}")
-            return owners
-        return None
+            page_key = result.get("pageKey")
+            if not page_key:
+                return balances
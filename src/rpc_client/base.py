@@ -2,13 +2,26 @@ from abc import ABC, abstractmethod
 
 class RPCClientBase(ABC):
     @abstractmethod
-    async def get_native_balance(self, network: str, address: str) -> str:
+    async def get_native_balance(self, network: str, address: str) -> str | None:
+        ...
+
+    @abstractmethod
+    async def get_token_balances(self, network: str, address: str) -> dict[str, str] | None:
+        """Nonzero ERC-20 balances of the address, token contract -> raw amount."""
         ...
 
     @abstractmethod
     async def is_eoa(self, network: str, address: str) -> bool | None:
         ...
 
+    @abstractmethod
+    async def get_code(self, network: str, address: str) -> str | None:
+        ...
+
+    @abstractmethod
+    async def classify_account(self, network: str, address: str) -> tuple[bool | None, bool | None]:
+        ...
+
     @abstractmethod
     async def is_safe(self, network: str, address: str) -> bool | None:
         ...
@@ -25,3 +38,6 @@ class RPCClientBase(ABC):
     async def get_safe_owners(self, network: str, address: str) -> list[str] | None:
         ...
 
+    @abstractmethod
+    async def get_block_number(self, network: str) -> int | None:
+        ...
@@ -0,0 +1,110 @@
+import asyncio
+import itertools
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from src.metrics import registry
+from .throttle import JsonRpcError
+
+logger = logging.getLogger(__name__)
+
+CALLS = registry.counter("rpc_calls_total", "JSON-RPC calls by outcome", ("network", "method", "outcome"))
+CALL_SECONDS = registry.histogram(
+    "rpc_call_seconds", "JSON-RPC call latency, batching included", ("network", "method"))
+BATCH_CALLS = registry.histogram(
+    "rpc_batch_calls", "Calls per JSON-RPC batch request", buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000))
+
+# (network, payloads) -> list of JSON-RPC response objects
+SendBatch = Callable[[str, List[Dict[str, Any]]], Awaitable[List[Dict[str, Any]]]]
+
+class JsonRpcBatcher:
+    """
+    Collects pending JSON-RPC calls per network and sends them as a single
+    batch array, either when `max_batch_size` calls are queued or when
+    `window` seconds have passed since the first call of the batch.
+    """
+    def __init__(self, send: SendBatch, max_batch_size: int = 50, window: float = 0.01):
+        self._send = send
+        self._max_batch_size = max(1, max_batch_size)
+        self._window = window
+        self._ids = itertools.count(1)
+        self._pending: Dict[str, List[Tuple[Dict[str, Any], asyncio.Future]]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._inflight: set[asyncio.Task] = set()
+
+    async def request(self, network: str, method: str, params: list) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        payload = {
+            "jsonrpc": "2.0",
+            "method": method,
+            "params": params,
+            "id": next(self._ids)
+        }
+
+        pending = self._pending.setdefault(network, [])
+        pending.append((payload, future))
+
+        if len(pending) >= self._max_batch_size:
+            self._flush(network)
+        elif network not in self._timers:
+            self._timers[network] = loop.call_later(self._window, self._flush, network)
+
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await future
+            outcome = "ok"
+            return result
+        finally:
+            CALL_SECONDS.observe(time.perf_counter() - start, network=network, method=method)
+            CALLS.inc(network=network, method=method, outcome=outcome)
+
+    async def aclose(self):
+        for network in list(self._pending):
+            self._flush(network)
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+    def _flush(self, network: str):
+        timer = self._timers.pop(network, None)
+        if timer:
+            timer.cancel()
+
+        batch = self._pending.pop(network, None)
+        if not batch:
+            return
+
+        task = asyncio.create_task(self._dispatch(network, batch))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, network: str, batch: List[Tuple[Dict[str, Any], asyncio.Future]]):
+        payloads = [payload for payload, _ in batch]
+        logger.debug("Sending batch of %d calls to %s", len(payloads), network)
+        BATCH_CALLS.observe(len(payloads))
+
+        try:
+            responses = await self._send(network, payloads)
+            if not isinstance(responses, list):
+                # some providers answer a malformed batch with a single error object
+                raise ValueError(f"Expected a batch response, got: {responses}")
+            by_id = {response.get("id"): response for response in responses}
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for payload, future in batch:
+            if future.done():
+                continue
+            response = by_id.get(payload["id"])
+            if response is None:
+                future.set_exception(KeyError(f"Missing response for id {payload['id']}"))
+            elif response.get("error") is not None:
+                # raised, so a failed call is never taken, or cached, as a result
+                future.set_exception(JsonRpcError(response["error"]))
+            else:
+                future.set_result(response.get("result"))
@@ -0,0 +1,41 @@
+from enum import Enum
+
+class AccountKind(Enum):
+    EOA = "eoa"
+    SAFE_PROXY = "safe_proxy"
+    CONTRACT = "contract"
+    # a generic proxy, or code we can't read: only a call can tell
+    UNKNOWN = "unknown"
+
+# Safe proxies from 1.1.0 on answer masterCopy() in the proxy itself, so
+# its selector is pushed (PUSH32 or PUSH4) in their runtime code
+MASTER_COPY_PATTERNS = ("7fa619486e", "63a619486e")
+
+# proxies that forward every call, which may land on a Safe
+DELEGATING_PROXY_PATTERNS = (
+    # EIP-897 implementation() and proxyType() dispatch, as in Safe 1.0.0 proxies,
+    # which forward masterCopy() to the Safe like any other call
+    "635c60da1b",
+    "634555d5c9",
+    "363d3d373d3d3d363d73",                                              # EIP-1167 minimal proxy
+    "360894a13ba1a3210667c828492db98dca3e2076cc3735a920a3ca505d382bbc",  # EIP-1967 implementation slot
+    "a3f0ad74e5423aebfd80d3ef4346578335a9a72aeaee59ff6cb3582b35133d50",  # EIP-1967 beacon slot
+    "7050c9e0f4ca769c69bd3a8ef740bc37934f8e2c036e5a723fd8ee048ed3f8c3",  # OpenZeppelin legacy slot
+)
+
+# networks whose bytecode is not EVM bytecode
+NON_EVM_BYTECODE_NETWORKS = {"zksync"}
+
+def classify_code(network: str, code: str) -> AccountKind:
+    """Classify an account from its eth_getCode result alone."""
+    if code == "0x":
+        return AccountKind.EOA
+    if network in NON_EVM_BYTECODE_NETWORKS:
+        return AccountKind.UNKNOWN
+
+    code = code.lower()
+    if any(pattern in code for pattern in MASTER_COPY_PATTERNS):
+        return AccountKind.SAFE_PROXY
+    if any(pattern in code for pattern in DELEGATING_PROXY_PATTERNS):
+        return AccountKind.UNKNOWN
+    return AccountKind.CONTRACT
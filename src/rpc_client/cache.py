@@ -0,0 +1,167 @@
+import aiosqlite
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Tuple
+
+from src.metrics import registry
+from src.sql_loader import load_queries
+
+logger = logging.getLogger(__name__)
+
+LOOKUPS = registry.counter("rpc_cache_lookups_total", "RPC cache lookups by outcome", ("method", "outcome"))
+
+DAY = 24 * 60 * 60
+
+# seconds a result stays valid when asked at "latest"; None never expires
+METHOD_TTLS = {
+    "eth_getCode": 30 * DAY,
+    "eth_getBalance": 60,
+    "eth_call": 5 * 60,
+    "alchemy_getTokenBalances": 60,
+}
+
+# eth_call TTLs by 4-byte selector
+CALL_TTLS = {
+    "0xa619486e": 30 * DAY,   # masterCopy()
+    "0xe75235b8": 60 * 60,    # getThreshold()
+    "0xaffed0e0": 60,         # nonce()
+    "0xa0e67e2b": 60 * 60,    # getOwners()
+    "0x70a08231": 60,         # balanceOf(address)
+}
+
+BLOCK_TAGS = {"latest", "pending", "safe", "finalized", "earliest"}
+
+class RPCCache:
+    """
+    Two-level cache of JSON-RPC results keyed by (network, method, params):
+    an in-memory LRU in front of a SQLite file. Results asked at a specific
+    block number never expire; results at a block tag use METHOD_TTLS.
+
+    mode is "use" (read and write), "warm" (write only) or "bypass".
+    """
+    def __init__(self, db_file: str, mode: str = "use", max_entries: int = 100_000, flush_size: int = 500):
+        self.mode = mode
+        self._db_file = db_file
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        self._queries = load_queries(os.path.join(current_dir, "cache.sql"))
+        self._conn = None
+        self._connect_lock = asyncio.Lock()
+        # key -> (JSON-encoded result, expires_at)
+        self._memory: OrderedDict[str, Tuple[str, float | None]] = OrderedDict()
+        self._fully_loaded = False
+        self._max_entries = max_entries
+        self._pending = []
+        self._flush_size = flush_size
+        self.stats = Counter()
+
+    async def get(self, network: str, method: str, params: list) -> Any:
+        """Return the cached result, or None on a miss."""
+        if self.mode != "use":
+            return None
+
+        await self._connect()
+        key = self._key(network, method, params)
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+        elif not self._fully_loaded:
+            row = await self._queries.get_rpc_cache_entry(self._conn, key=key)
+            if row:
+                entry = (row[0], row[1])
+                self._remember(key, entry)
+
+        if entry is None or (entry[1] is not None and entry[1] < time.time()):
+            self.stats[(method, "miss")] += 1
+            LOOKUPS.inc(method=method, outcome="miss")
+            return None
+
+        self.stats[(method, "hit")] += 1
+        LOOKUPS.inc(method=method, outcome="hit")
+        return json.loads(entry[0])
+
+    async def set(self, network: str, method: str, params: list, result: Any):
+        # errors come back as None and are never cached
+        if self.mode == "bypass" or result is None:
+            return
+
+        ttl = self._ttl(method, params)
+        expires_at = time.time() + ttl if ttl is not None else None
+        key = self._key(network, method, params)
+        raw = json.dumps(result)
+        self._remember(key, (raw, expires_at))
+        self._pending.append({"key": key, "result": raw, "expires_at": expires_at})
+
+        if len(self._pending) >= self._flush_size:
+            await self._flush()
+
+    async def aclose(self):
+        await self._flush()
+        if self._conn:
+            await self._queries.delete_expired_rpc_cache_entries(self._conn, now=time.time())
+            await self._conn.commit()
+            await self._conn.close()
+            self._conn = None
+
+        if self.stats:
+            summary = ", ".join(
+                f"{method} {self.stats[(method, 'hit')]} hits / {self.stats[(method, 'miss')]} misses"
+                for method in sorted({method for method, _ in self.stats})
+            )
+            logger.info(f"RPC cache: {summary}")
+
+    async def _connect(self):
+        if self._conn:
+            return
+        async with self._connect_lock:
+            if self._conn:
+                return
+            conn = await aiosqlite.connect(self._db_file)
+            await conn.execute("PRAGMA journal_mode=WAL")
+            await self._queries.create_rpc_cache_table(conn)
+            await conn.commit()
+
+            # load live entries up front; if they all fit in memory, a memory
+            # miss is a miss on disk too and no per-call lookup is needed
+            if self.mode == "use":
+                rows = await self._queries.get_live_rpc_cache_entries(
+                    conn, now=time.time(), limit=self._max_entries
+                )
+                for key, result, expires_at in rows:
+                    self._memory[key] = (result, expires_at)
+                self._fully_loaded = len(rows) < self._max_entries
+                logger.info(f"Loaded {len(rows)} RPC cache entries from {self._db_file}")
+            self._conn = conn
+
+    async def _flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        await self._connect()
+        await self._queries.upsert_rpc_cache_entries(self._conn, pending)
+        await self._conn.commit()
+
+    def _remember(self, key: str, entry: Tuple[str, float | None]):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._max_entries:
+            self._memory.popitem(last=False)
+            # evicted entries are only on disk from now on
+            self._fully_loaded = False
+
+    def _key(self, network: str, method: str, params: list) -> str:
+        return json.dumps([network, method, params], sort_keys=True, separators=(",", ":"))
+
+    def _ttl(self, method: str, params: list) -> float | None:
+        block = params[-1] if params else None
+        if isinstance(block, str) and block not in BLOCK_TAGS:
+            # pinned to a block number, the result can't change
+            return None
+        if method == "eth_call" and params and isinstance(params[0], dict):
+            selector = params[0].get("data", "")[:10]
+            if selector in CALL_TTLS:
+                return CALL_TTLS[selector]
+        return METHOD_TTLS.get(method, 0)
@@ -0,0 +1,24 @@
+-- name: create_rpc_cache_table!
+CREATE TABLE IF NOT EXISTS rpc_cache (
+    key TEXT PRIMARY KEY,
+    result TEXT NOT NULL,
+    expires_at REAL
+);
+
+-- name: get_live_rpc_cache_entries
+SELECT key, result, expires_at FROM rpc_cache
+WHERE expires_at IS NULL OR expires_at >= :now
+LIMIT :limit;
+
+-- name: get_rpc_cache_entry^
+SELECT result, expires_at FROM rpc_cache WHERE key = :key;
+
+-- name: upsert_rpc_cache_entries*!
+INSERT INTO rpc_cache (key, result, expires_at)
+VALUES (:key, :result, :expires_at)
+ON CONFLICT(key) DO UPDATE SET
+    result = excluded.result,
+    expires_at = excluded.expires_at;
+
+-- name: delete_expired_rpc_cache_entries!
+DELETE FROM rpc_cache WHERE expires_at IS NOT NULL AND expires_at < :now;
@@ -2,11 +2,24 @@ import logging
 from functools import wraps
 
 import httpx
-from aiolimiter import AsyncLimiter
+
+from .multicall import MulticallUnavailable
+from .throttle import JsonRpcError
 
 logger = logging.getLogger(__name__)
 
-def alchemy_request(json_rpc_method, params_builder=None):
+async def cached(self, network: str, method: str, params: list, fetch):
+    """Return the cached result for the call, or fetch() and cache it. Errors raise and aren't cached."""
+    if self._cache is None:
+        return await fetch()
+
+    result = await self._cache.get(network, method, params)
+    if result is None:
+        result = await fetch()
+        await self._cache.set(network, method, params, result)
+    return result
+
+def rpc_request(json_rpc_method, params_builder=None):
     def decorator(func):
         @wraps(func)
         async def wrapper(self, network: str, address: str, *args, **kwargs):
@@ -14,25 +27,20 @@ def alchemy_request(json_rpc_method, params_builder=None):
                 logger.debug("Unsupported network: %s", network)
                 return func(self, network, address, None, *args, **kwargs)
 
-            url = self.base_urls[network]
-            params = params_builder(address) if params_builder else [address, "latest"]
-            payload = {
-                "jsonrpc": "2.0",
-                "method": json_rpc_method,
-                "params": params,
-                "id": 1
-            }
+            block = self.block_tag(network)
+            params = params_builder(address, block) if params_builder else [address, block]
 
             try:
-                # rate-limit and optionally bound concurrency
-                async with self._alchemy_rate_limit:
-                    async with self._alchemy_concurrency:
-                        resp = await self._http.post(url, json=payload)
-                resp.raise_for_status()
-                data = resp.json()
-                result = data.get("result")
+                result = await cached(
+                    self, network, json_rpc_method, params,
+                    lambda: self._batcher.request(network, json_rpc_method, params)
+                )
                 return func(self, network, address, result, *args, **kwargs)
 
+            except JsonRpcError as e:
+                if not e.reverted:
+                    logger.error("RPC error during %s for %s on %s: %s", json_rpc_method, address, network, e)
+                return func(self, network, address, None, *args, **kwargs)
             except httpx.HTTPError as e:
                 logger.error("Network error during %s for %s on %s: %s",
                              json_rpc_method, address, network, e)
@@ -43,3 +51,30 @@ def alchemy_request(json_rpc_method, params_builder=None):
                 return func(self, network, address, None, *args, **kwargs)
         return wrapper
     return decorator
+
+
+def multicall_request(selector):
+    """
+    eth_call `selector` on the address through the Multicall3 aggregator,
+    using the plain per-call eth_call when it is disabled or unavailable.
+    """
+    def decorator(func):
+        params_builder = lambda addr, block: [{"to": addr, "data": selector}, block]
+        fallback = rpc_request("eth_call", params_builder=params_builder)(func)
+
+        @wraps(func)
+        async def wrapper(self, network: str, address: str, *args, **kwargs):
+            if self._multicall is None or network not in self.base_urls:
+                return await fallback(self, network, address, *args, **kwargs)
+
+            try:
+                # cached under the same key as the per-call eth_call
+                result = await cached(
+                    self, network, "eth_call", params_builder(address, self.block_tag(network)),
+                    lambda: self._multicall.call(network, address, selector)
+                )
+            except MulticallUnavailable:
+                return await fallback(self, network, address, *args, **kwargs)
+            return func(self, network, address, result, *args, **kwargs)
+        return wrapper
+    return decorator
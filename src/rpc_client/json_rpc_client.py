@@ -0,0 +1,353 @@
+import logging
+import asyncio
+import functools
+import ssl
+import time
+import httpx
+from aiolimiter import AsyncLimiter
+
+from src.config import config
+from src.metrics import registry
+from .base import RPCClientBase
+from .batcher import JsonRpcBatcher
+from .bytecode import AccountKind, classify_code
+from .cache import RPCCache
+from .decorators import cached, rpc_request, multicall_request
+from .multicall import Multicall3Aggregator, MulticallUnavailable
+from .throttle import JsonRpcError, NetworkThrottle, RETRYABLE_STATUS_CODES, THROTTLED_RPC_CODES, retry_delay
+from .tokens import balance_of_calldata, load_token_list
+
+logger = logging.getLogger(__name__)
+
+THROTTLE_WAIT = registry.histogram(
+    "rpc_throttle_wait_seconds", "Time waiting for a per-network throttle slot", ("provider", "network"))
+RATE_LIMIT_WAIT = registry.histogram(
+    "rpc_rate_limit_wait_seconds", "Time waiting on the provider rate limiter", ("provider",))
+SEMAPHORE_WAIT = registry.histogram(
+    "rpc_semaphore_wait_seconds", "Time waiting on the provider concurrency semaphore", ("provider",))
+HTTP_SECONDS = registry.histogram(
+    "rpc_http_seconds", "HTTP round trip of a JSON-RPC request", ("provider", "network"))
+DECODE_SECONDS = registry.histogram(
+    "rpc_json_decode_seconds", "Time parsing a JSON-RPC response body", ("provider", "network"))
+HTTP_REQUESTS = registry.counter(
+    "rpc_http_requests_total", "JSON-RPC HTTP requests by outcome", ("provider", "network", "status"))
+INFLIGHT = registry.gauge(
+    "rpc_inflight_requests", "JSON-RPC HTTP requests in flight", ("provider", "network"))
+RPC_ERRORS = registry.counter(
+    "rpc_error_responses_total", "JSON-RPC calls answered with an error object, by code", ("provider", "network", "code"))
+
+@functools.cache
+def _ssl_context() -> ssl.SSLContext:
+    # loading the CA bundle is most of an AsyncClient's construction, one context serves every provider
+    return httpx.create_ssl_context()
+
+class JsonRpcClient(RPCClientBase):
+    """
+    Client for one provider: a set of JSON-RPC endpoints keyed by network,
+    with their own rate limits, batching and Multicall3 aggregation.
+    `rate_limiter` replaces the provider's own AsyncLimiter, e.g. with one
+    shared between processes. With `shards` processes each running one,
+    every process gets its share of the concurrency and per-network budgets.
+    """
+    RATE_LIMIT = 250
+    CONCURRENCY = 50
+
+    def __init__(self, name: str, base_urls: dict[str, str], cache: RPCCache | None = None,
+                 rate_limiter=None, shards: int = 1):
+        logger.info(f"Initializing {name} client")
+
+        self.name = name
+        self.base_urls = base_urls
+        # block number per network every call is pinned to, "latest" if absent
+        self.blocks: dict[str, str] = {}
+
+        # async HTTP client (reused, pooled connections), built on first request
+        self._http = None
+
+        # async rate limit: adjust RATE_LIMIT to match the provider plan
+        self._rate_limit = rate_limiter or AsyncLimiter(self.RATE_LIMIT, 1)
+
+        # bound in-flight concurrency to avoid overwhelming the loop/remote
+        self._concurrency = asyncio.Semaphore(max(1, self.CONCURRENCY // shards))
+
+        # per-network adaptive limits under the plan-wide ones above, so a
+        # slow or throttled network can't hold the slots the others need;
+        # each shard adapts its own share, together they stay within budget
+        self._throttles = {
+            network: NetworkThrottle(
+                network,
+                rate=config.args.network_rate / shards,
+                concurrency=max(1, config.args.network_concurrency // shards),
+                max_rate=self.RATE_LIMIT / shards,
+                max_concurrency=max(1, self.CONCURRENCY // shards)
+            )
+            for network in self.base_urls
+        }
+
+        # pack pending calls per network into JSON-RPC batch arrays
+        self._batcher = JsonRpcBatcher(
+            self._post_batch,
+            max_batch_size=config.args.batch_size,
+            window=config.args.batch_window_ms / 1000
+        )
+
+        # persistent response cache in front of every call, shared by providers
+        self._cache = cache
+
+        # pack the Safe eth_calls of many addresses into one aggregate3 call
+        self._multicall = None
+        if config.args.multicall_size > 0:
+            self._multicall = Multicall3Aggregator(
+                self._batcher.request,
+                block_tag=self.block_tag,
+                max_calls=config.args.multicall_size,
+                window=config.args.batch_window_ms / 1000
+            )
+
+        # network -> ERC-20 contracts asked with balanceOf()
+        self._token_list = load_token_list(config.args.token_list) if config.args.token_list else {}
+
+    async def aclose(self):
+        if self._multicall:
+            await self._multicall.aclose()
+        await self._batcher.aclose()
+        if self._http:
+            await self._http.aclose()
+
+    def _client(self) -> httpx.AsyncClient:
+        # providers of networks the input never touches don't build one
+        if self._http is None:
+            self._http = httpx.AsyncClient(timeout=10, http2=True, verify=_ssl_context())
+        return self._http
+
+    def block_tag(self, network: str) -> str:
+        return self.blocks.get(network, "latest")
+
+    def pin_block(self, network: str, block_number: int):
+        self.blocks[network] = hex(block_number)
+
+    async def get_block_number(self, network: str) -> int | None:
+        if network not in self.base_urls:
+            return None
+        try:
+            result = await self._batcher.request(network, "eth_blockNumber", [])
+        except (httpx.HTTPError, ValueError, KeyError) as e:
+            logger.error("Error during eth_blockNumber on %s: %s", network, e)
+            return None
+        return int(result, 16) if result else None
+
+    def is_available(self, network: str) -> bool:
+        return network in self.base_urls and not self._throttles[network].is_open
+
+    def route_score(self, network: str) -> float:
+        """Lower is better: expected latency inflated by errors and lack of headroom."""
+        return self._throttles[network].score()
+
+    def rate_budget(self, network: str) -> float:
+        """Requests per second this provider currently allows on the network, 0 while its circuit is open."""
+        if not self.is_available(network):
+            return 0.0
+        return self._throttles[network].rate
+
+    def has_headroom(self, network: str) -> bool:
+        return self._throttles[network].has_headroom()
+
+    async def _post_batch(self, network: str, payloads: list[dict]) -> list[dict]:
+        """
+        Send a batch, then send again the calls answered with a rate or
+        compute-unit limit error, with the same backoff and throttle feedback
+        as an HTTP 429. After the last retry their errors are returned.
+        """
+        throttle = self._throttles[network]
+        answered = {}
+        attempt = 0
+        while True:
+            responses = await self._post(network, payloads)
+            if not isinstance(responses, list):
+                return responses
+            throttled = set()
+            for response in responses:
+                error = response.get("error")
+                if isinstance(error, dict):
+                    RPC_ERRORS.inc(provider=self.name, network=network, code=str(error.get("code")))
+                    if error.get("code") in THROTTLED_RPC_CODES and attempt < config.args.max_retries:
+                        throttled.add(response.get("id"))
+                        continue
+                answered[response.get("id")] = response
+            if not throttled:
+                return list(answered.values())
+
+            throttle.record_failure(throttled=True)
+            payloads = [payload for payload in payloads if payload["id"] in throttled]
+            delay = retry_delay(attempt, None)
+            logger.warning("Retrying %d throttled calls on %s in %.2fs (attempt %d)",
+                           len(payloads), network, delay, attempt + 1)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _post(self, network: str, payloads: list[dict]) -> list[dict]:
+        throttle = self._throttles[network]
+        attempt = 0
+        while True:
+            retry_after = None
+            try:
+                # a batch counts as a single request against the rate limits
+                labels = {"provider": self.name, "network": network}
+                waiting = time.perf_counter()
+                async with throttle.slot():
+                    slotted = time.perf_counter()
+                    THROTTLE_WAIT.observe(slotted - waiting, **labels)
+                    async with self._rate_limit:
+                        limited = time.perf_counter()
+                        RATE_LIMIT_WAIT.observe(limited - slotted, provider=self.name)
+                        async with self._concurrency:
+                            SEMAPHORE_WAIT.observe(time.perf_counter() - limited, provider=self.name)
+                            INFLIGHT.inc(**labels)
+                            start = time.monotonic()
+                            try:
+                                resp = await self._client().post(self.base_urls[network], json=payloads)
+                            finally:
+                                INFLIGHT.dec(**labels)
+                            latency = time.monotonic() - start
+                HTTP_SECONDS.observe(latency, **labels)
+                HTTP_REQUESTS.inc(status=resp.status_code, **labels)
+
+                if resp.status_code in RETRYABLE_STATUS_CODES:
+                    throttle.record_failure(throttled=True)
+                    retry_after = resp.headers.get("Retry-After")
+                resp.raise_for_status()
+                throttle.record_success(latency)
+                with DECODE_SECONDS.time(**labels):
+                    return resp.json()
+
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code not in RETRYABLE_STATUS_CODES or attempt >= config.args.max_retries:
+                    raise
+                error = e
+            except httpx.TransportError as e:
+                HTTP_REQUESTS.inc(provider=self.name, network=network, status=type(e).__name__)
+                throttle.record_failure(throttled=False)
+                if attempt >= config.args.max_retries:
+                    raise
+                error = e
+
+            delay = retry_delay(attempt, retry_after)
+            logger.warning("Retrying %d calls on %s in %.2fs (attempt %d): %s",
+                           len(payloads), network, delay, attempt + 1, error)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    @rpc_request("eth_getBalance")
+    def get_native_balance(self, network: str, address: str, result: str | None) -> str | None:
+        # a missing result is unknown, not a zero balance
+        if result:
+            return str(int(result, 16))
+        return None
+
+    async def get_token_balances(self, network: str, address: str) -> dict[str, str] | None:
+        """
+        balanceOf() of every --token-list token on the network, packed into
+        Multicall3 calls. Providers with a holdings endpoint override this.
+        None is unknown, and leaves the stored balances as they are: no
+        token list for the network, or a call that failed.
+        """
+        if network not in self.base_urls:
+            return None
+        tokens = self._token_list.get(network)
+        if not tokens:
+            return None
+        balances = await asyncio.gather(*(self.get_token_balance(network, address, token) for token in tokens))
+        if any(balance is None for balance in balances):
+            return None
+        return {token: balance for token, balance in zip(tokens, balances) if balance and balance != "0"}
+
+    async def get_token_balance(self, network: str, address: str, token: str) -> str | None:
+        calldata = balance_of_calldata(address)
+        params = [{"to": token, "data": calldata}, self.block_tag(network)]
+
+        async def fetch():
+            if self._multicall is not None:
+                try:
+                    return await self._multicall.call(network, token, calldata)
+                except MulticallUnavailable:
+                    pass
+            return await self._batcher.request(network, "eth_call", params)
+
+        try:
+            # cached under the same key as the per-call eth_call
+            result = await cached(self, network, "eth_call", params, fetch)
+        except JsonRpcError as e:
+            if e.reverted:
+                return "0"
+            logger.error("Error during balanceOf of %s for %s on %s: %s", token, address, network, e)
+            return None
+        except (httpx.HTTPError, ValueError, KeyError) as e:
+            logger.error("Error during balanceOf of %s for %s on %s: %s", token, address, network, e)
+            return None
+        # reverted in aggregate3, or no code at the token's address on this network: no balance
+        if not result or result == '0x':
+            return "0"
+        return str(int(result[2:66], 16))
+
+    @rpc_request("eth_getCode")
+    def get_code(self, network: str, address: str, result: str | None) -> str | None:
+        return result
+
+    async def classify_account(self, network: str, address: str) -> tuple[bool | None, bool | None]:
+        """
+        Return (is_eoa, is_safe) from the account code, only calling
+        masterCopy() when the code alone can't tell.
+        """
+        code = await self.get_code(network, address)
+        if code is None:
+            return None, await self.is_safe(network, address)
+
+        kind = classify_code(network, code)
+        if kind == AccountKind.EOA:
+            return True, False
+        if kind == AccountKind.SAFE_PROXY:
+            return False, True
+        if kind == AccountKind.CONTRACT:
+            return False, False
+        return False, await self.is_safe(network, address)
+
+    @rpc_request("eth_getCode")
+    def is_eoa(self, network: str, address: str, result: str | None) -> bool | None:
+        if result:
+            return result == '0x'
+        return None
+
+    # Check for masterCopy() (method signature 0xa619486e),
+    # a good indicator of a Gnosis Safe proxy
+    @multicall_request("0xa619486e")
+    def is_safe(self, network: str, address: str, result: str | None) -> bool | None:
+        return result is not None and result != '0x'
+
+    # Check for getThreshold() (method signature 0xe75235b8)
+    @multicall_request("0xe75235b8")
+    def get_safe_threshold(self, network: str, address: str, result: str | None) -> int | None:
+        if result and result != '0x':
+            return int(result, 16)
+        return None
+
+    # Check for nonce() (method signature 0xaffed0e0)
+    @multicall_request("0xaffed0e0")
+    def get_safe_nonce(self, network: str, address: str, result: str | None) -> int | None:
+        if result and result != '0x':
+            return int(result, 16)
+        return None
+
+    # Check for getOwners(method signature 0xa0e67e2b)
+    @multicall_request("0xa0e67e2b")
+    def get_safe_owners(self, network: str, address: str, result: str | None) -> list[str] | None:
+        if result and result != '0x':
+            # The result of this call is a hex string of tightly packed addresses.
+            # We skip first the '0x' prefix (2) + 128 hex chars: offset (64) + array length (64)
+            raw_owners = result[130:]
+            owners = []
+            for i in range(0, len(raw_owners), 64):
+                padded_addr = raw_owners[i:i+64]
+                addr_hex = padded_addr[24:64] # The actual address hex (last 40 chars)
+                owners.append(f"0x{addr_hex}")
+            return owners
+        return None
@@ -0,0 +1,177 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# https://www.multicall3.com/deployments
+MULTICALL3_ADDRESS = "0xca11bde05977b3631167028862be2a173976ca11"
+MULTICALL3_ADDRESS_OVERRIDES = {
+    "zksync": "0xf9cda624fbc7e059355ce98a31693d299facd963",
+}
+
+# aggregate3((address,bool,bytes)[]) returns ((bool,bytes)[])
+AGGREGATE3_SELECTOR = "82ad56cb"
+
+# (network, method, params) -> JSON-RPC result
+Request = Callable[[str, str, list], Awaitable[str | None]]
+
+class MulticallUnavailable(Exception):
+    """Raised when a sub-call has to be sent on its own instead."""
+
+def _word(value: int) -> str:
+    return f"{value:064x}"
+
+def _padded(data: str) -> str:
+    # right-pad hex data to a multiple of 32 bytes
+    return data + "0" * (-len(data) % 64)
+
+def encode_aggregate3(calls: List[Tuple[str, str]]) -> str:
+    """
+    ABI-encode an aggregate3 call for (target, calldata) pairs, with
+    allowFailure set on every sub-call.
+    """
+    heads = []
+    tails = []
+    offset = len(calls) * 32
+    for target, calldata in calls:
+        data = calldata.removeprefix("0x")
+        tail = (
+            _word(int(target, 16))
+            + _word(1)                      # allowFailure
+            + _word(0x60)                   # offset to callData within the tuple
+            + _word(len(data) // 2)
+            + _padded(data)
+        )
+        heads.append(_word(offset))
+        tails.append(tail)
+        offset += len(tail) // 2
+
+    return "0x" + AGGREGATE3_SELECTOR + _word(0x20) + _word(len(calls)) + "".join(heads) + "".join(tails)
+
+def decode_aggregate3(result: str) -> List[Tuple[bool, str]]:
+    """
+    Decode the (bool success, bytes returnData)[] tuple array returned by
+    aggregate3 into (success, '0x'-prefixed returnData) pairs.
+    """
+    raw = result.removeprefix("0x")
+
+    def word(byte_offset: int) -> int:
+        return int(raw[byte_offset * 2:byte_offset * 2 + 64], 16)
+
+    array_start = word(0)
+    length = word(array_start)
+    elements_start = array_start + 32
+
+    decoded = []
+    for i in range(length):
+        tuple_start = elements_start + word(elements_start + i * 32)
+        success = word(tuple_start) != 0
+        data_start = tuple_start + word(tuple_start + 32)
+        data_length = word(data_start)
+        data = raw[(data_start + 32) * 2:(data_start + 32 + data_length) * 2]
+        decoded.append((success, f"0x{data}"))
+    return decoded
+
+class Multicall3Aggregator:
+    """
+    Collects eth_call sub-calls per network and packs them into a single
+    Multicall3 aggregate3 eth_call, once `max_calls` are queued or `window`
+    seconds have passed. Networks without a Multicall3 deployment raise
+    MulticallUnavailable so callers can use the per-call path.
+    `block_tag(network)` gives the block the aggregate calls are made at.
+    """
+    def __init__(self, request: Request, block_tag: Callable[[str], str] = lambda network: "latest",
+                 max_calls: int = 500, window: float = 0.01):
+        self._request = request
+        self._block_tag = block_tag
+        self._max_calls = max(1, max_calls)
+        self._window = window
+        self._deployed: Dict[str, asyncio.Future] = {}
+        self._pending: Dict[str, List[Tuple[Tuple[str, str], asyncio.Future]]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._inflight: set[asyncio.Task] = set()
+
+    async def call(self, network: str, target: str, calldata: str) -> str | None:
+        if not await self._is_deployed(network):
+            raise MulticallUnavailable(network)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(network, [])
+        pending.append(((target, calldata), future))
+
+        if len(pending) >= self._max_calls:
+            self._flush(network)
+        elif network not in self._timers:
+            self._timers[network] = loop.call_later(self._window, self._flush, network)
+
+        return await future
+
+    async def aclose(self):
+        for network in list(self._pending):
+            self._flush(network)
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+    async def _is_deployed(self, network: str) -> bool:
+        # the first caller per network probes the contract, the rest wait on it
+        probe = self._deployed.get(network)
+        if probe is None:
+            probe = asyncio.get_running_loop().create_future()
+            self._deployed[network] = probe
+            try:
+                code = await self._request(network, "eth_getCode", [self._address(network), "latest"])
+                deployed = bool(code) and code != "0x"
+                if not deployed:
+                    logger.info("Multicall3 not available on %s, using per-call path", network)
+            except Exception as e:
+                # don't remember a transient failure, probe again on the next call
+                logger.warning("Could not probe Multicall3 on %s: %s", network, e)
+                del self._deployed[network]
+                deployed = False
+            probe.set_result(deployed)
+        return await probe
+
+    def _address(self, network: str) -> str:
+        return MULTICALL3_ADDRESS_OVERRIDES.get(network, MULTICALL3_ADDRESS)
+
+    def _flush(self, network: str):
+        timer = self._timers.pop(network, None)
+        if timer:
+            timer.cancel()
+
+        batch = self._pending.pop(network, None)
+        if not batch:
+            return
+
+        task = asyncio.create_task(self._dispatch(network, batch))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, network: str, batch: List[Tuple[Tuple[str, str], asyncio.Future]]):
+        calls = [call for call, _ in batch]
+        logger.debug("Sending aggregate3 with %d sub-calls to %s", len(calls), network)
+
+        try:
+            result = await self._request(
+                network,
+                "eth_call",
+                [{"to": self._address(network), "data": encode_aggregate3(calls)}, self._block_tag(network)]
+            )
+            if not result or result == "0x":
+                raise ValueError("Empty aggregate3 result")
+            decoded = decode_aggregate3(result)
+            if len(decoded) != len(batch):
+                raise ValueError(f"Expected {len(batch)} results, got {len(decoded)}")
+        except Exception as e:
+            # let every sub-call retry on its own rather than losing the chunk
+            logger.warning("aggregate3 on %s failed, falling back to per-call path: %s", network, e)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(MulticallUnavailable(network))
+            return
+
+        for (_, future), (success, data) in zip(batch, decoded):
+            if not future.done():
+                future.set_result(data if success else None)
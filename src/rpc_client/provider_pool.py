@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import time
+
+from .base import RPCClientBase
+from .json_rpc_client import JsonRpcClient
+
+logger = logging.getLogger(__name__)
+
+# one JSON-RPC call each: classify_account and the token scans send several,
+# which a hedge would all send again
+HEDGED_METHODS = {
+    "get_native_balance", "is_eoa", "get_code", "is_safe",
+    "get_safe_threshold", "get_safe_nonce", "get_safe_owners",
+}
+
+class ProviderPool(RPCClientBase):
+    """
+    Routes each call to the provider with the best score for its network:
+    live EWMA latency, error rate and remaining rate budget. When `hedge`
+    is set and a single-call method outlives a few times its usual wall
+    time on the provider, queueing in the batcher and the throttle
+    included, the same call is sent to the next best provider, if that
+    one can take it without waiting, and the first answer wins.
+    """
+    def __init__(self, providers: list[JsonRpcClient], hedge: bool = True, min_hedge_delay: float = 0.1):
+        self.providers = providers
+        self._hedge = hedge
+        self._min_hedge_delay = min_hedge_delay
+        # (provider, network, method) -> EWMA of the call's wall time
+        self._call_latency: dict[tuple[str, str, str], float] = {}
+        self._ewma_weight = 0.2
+
+    @property
+    def networks(self) -> set[str]:
+        return {network for provider in self.providers for network in provider.base_urls}
+
+    async def aclose(self):
+        await asyncio.gather(*(provider.aclose() for provider in self.providers))
+
+    async def get_native_balance(self, network: str, address: str) -> str | None:
+        return await self._route("get_native_balance", network, address)
+
+    async def get_token_balances(self, network: str, address: str) -> dict[str, str] | None:
+        return await self._route("get_token_balances", network, address)
+
+    async def is_eoa(self, network: str, address: str) -> bool | None:
+        return await self._route("is_eoa", network, address)
+
+    async def get_code(self, network: str, address: str) -> str | None:
+        return await self._route("get_code", network, address)
+
+    async def classify_account(self, network: str, address: str) -> tuple[bool | None, bool | None]:
+        return await self._route("classify_account", network, address)
+
+    async def is_safe(self, network: str, address: str) -> bool | None:
+        return await self._route("is_safe", network, address)
+
+    async def get_safe_threshold(self, network: str, address: str) -> int | None:
+        return await self._route("get_safe_threshold", network, address)
+
+    async def get_safe_nonce(self, network: str, address: str) -> int | None:
+        return await self._route("get_safe_nonce", network, address)
+
+    async def get_safe_owners(self, network: str, address: str) -> list[str] | None:
+        return await self._route("get_safe_owners", network, address)
+
+    async def get_block_number(self, network: str) -> int | None:
+        ranked = self._ranked(network)
+        return await ranked[0].get_block_number(network) if ranked else None
+
+    def pin_block(self, network: str, block_number: int):
+        # every provider has to answer at the same block
+        for provider in self.providers:
+            if network in provider.base_urls:
+                provider.pin_block(network, block_number)
+
+    def rate_budget(self, network: str) -> float:
+        return sum(provider.rate_budget(network) for provider in self.providers if network in provider.base_urls)
+
+    def _ranked(self, network: str) -> list[JsonRpcClient]:
+        candidates = [p for p in self.providers if network in p.base_urls]
+        # providers with an open circuit only if nothing else is left
+        available = [p for p in candidates if p.is_available(network)] or candidates
+        return sorted(available, key=lambda p: p.route_score(network))
+
+    async def _route(self, method: str, network: str, address: str):
+        ranked = self._ranked(network)
+        if not ranked:
+            logger.warning("No provider configured for network: %s", network)
+            return None
+
+        primary = ranked[0]
+        if not self._hedge or len(ranked) < 2 or method not in HEDGED_METHODS:
+            return await getattr(primary, method)(network, address)
+
+        start = time.monotonic()
+        first = asyncio.create_task(getattr(primary, method)(network, address))
+        delay = self._hedge_delay(primary, network, method)
+        done = set()
+        if delay is not None:
+            done, _ = await asyncio.wait({first}, timeout=delay)
+        backup = ranked[1]
+        if delay is None or done or not backup.has_headroom(network):
+            # not hedged: no wall time to compare with yet, or a backup that would only queue the copy
+            try:
+                return await first
+            finally:
+                self._observe(primary, network, method, time.monotonic() - start)
+
+        logger.debug("Hedging %s for %s on %s: %s -> %s",
+                     method, address, network, primary.name, backup.name)
+        second = asyncio.create_task(getattr(backup, method)(network, address))
+        pending = {first, second}
+        result = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    # errors come back as None, give the other provider its chance
+                    if result is not None:
+                        return result
+            return result
+        finally:
+            for task in pending:
+                task.cancel()
+            # a cancelled call still took at least this long, so a slow provider's hedge delay grows
+            self._observe(primary, network, method, time.monotonic() - start)
+
+    def _observe(self, provider: JsonRpcClient, network: str, method: str, elapsed: float):
+        key = (provider.name, network, method)
+        latency = self._call_latency.get(key)
+        self._call_latency[key] = elapsed if latency is None else \
+            (1 - self._ewma_weight) * latency + self._ewma_weight * elapsed
+
+    def _hedge_delay(self, provider: JsonRpcClient, network: str, method: str) -> float | None:
+        latency = self._call_latency.get((provider.name, network, method))
+        if latency is None:
+            return None
+        return max(self._min_hedge_delay, 3 * latency)
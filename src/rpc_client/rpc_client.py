@@ -1,8 +1,12 @@
 import logging
 from functools import wraps
 
+from src.config import config
 from .alchemy_client import AlchemyClient
 from .base import RPCClientBase
+from .cache import RPCCache
+from .json_rpc_client import JsonRpcClient
+from .provider_pool import ProviderPool
 
 logger = logging.getLogger(__name__)
 
@@ -23,30 +27,66 @@ def client_checker(func):
         return None
     return wrapper
 
+def _check_providers():
+    if not config.ALCHEMY_API_KEYS and not config.RPC_URLS:
+        raise ValueError("ALCHEMY_API_KEY environment variable not set.")
+
+def provider_rate_limits() -> dict[str, float]:
+    """Plan rate limit of every configured provider, by the name RPCClient gives it."""
+    _check_providers()
+    limits = {f"alchemy-{i}": AlchemyClient.RATE_LIMIT for i in range(len(config.ALCHEMY_API_KEYS))}
+    limits.update({f"rpc-{i}-{network}": JsonRpcClient.RATE_LIMIT for i, (network, _) in enumerate(config.RPC_URLS)})
+    return limits
+
 class RPCClient(RPCClientBase):
-    def __init__(self):
-        self.alchemy_client = AlchemyClient()
-        self.client_map = {
-            "arbitrum": self.alchemy_client,
-            "avalanche": self.alchemy_client,
-            "base": self.alchemy_client,
-            "bsc": self.alchemy_client,
-            "ethereum": self.alchemy_client,
-            "linea": self.alchemy_client,
-            "optimism": self.alchemy_client,
-            "polygon": self.alchemy_client,
-            "sei": self.alchemy_client,
-            "zksync": self.alchemy_client,
-        }
+    def __init__(self, rate_limiters: dict | None = None, shards: int = 1):
+        """
+        `rate_limiters` optionally replaces each provider's rate limiter, by
+        provider name. `shards` is the number of processes sharing the budgets.
+        """
+        _check_providers()
+        rate_limiters = rate_limiters or {}
+        self.cache = None
+        if config.args.rpc_cache != "bypass":
+            self.cache = RPCCache(config.RPC_CACHE_FILE, mode=config.args.rpc_cache)
+
+        providers = []
+        for i, key in enumerate(config.ALCHEMY_API_KEYS):
+            name = f"alchemy-{i}"
+            providers.append(AlchemyClient(key, cache=self.cache, name=name, rate_limiter=rate_limiters.get(name),
+                                           shards=shards))
+        for i, (network, url) in enumerate(config.RPC_URLS):
+            name = f"rpc-{i}-{network}"
+            providers.append(JsonRpcClient(name, {network: url}, cache=self.cache, rate_limiter=rate_limiters.get(name),
+                                           shards=shards))
+        self.provider_pool = ProviderPool(providers, hedge=config.args.hedge)
+        self.client_map = {network: self.provider_pool for network in sorted(self.provider_pool.networks)}
+
+    async def aclose(self):
+        await self.provider_pool.aclose()
+        if self.cache:
+            await self.cache.aclose()
 
     @client_checker
-    async def get_native_balance(self, client, network: str, address: str) -> float:
+    async def get_native_balance(self, client, network: str, address: str) -> str | None:
         return await client.get_native_balance(network, address)
 
+    @client_checker
+    async def get_token_balances(self, client, network: str, address: str) -> dict[str, str] | None:
+        return await client.get_token_balances(network, address)
+
     @client_checker
     async def is_eoa(self, client, network: str, address: str) -> bool | None:
         return await client.is_eoa(network, address)
 
+    @client_checker
+    async def get_code(self, client, network: str, address: str) -> str | None:
+        return await client.get_code(network, address)
+
+    @client_checker
+    async def classify_account(self, client, network: str, address: str) -> tuple[bool | None, bool | None]:
+        return await client.classify_account(network, address)
+
     @client_checker
     async def is_safe(self, client, network: str, address: str) -> bool | None:
         return await client.is_safe(network, address)
@@ -62,3 +102,14 @@ class RPCClient(RPCClientBase):
     @client_checker
     async def get_safe_owners(self, client, network: str, address: str) -> list[str] | None:
         return await client.get_safe_owners(network, address)
+
+    @client_checker
+    async def get_block_number(self, client, network: str) -> int | None:
+        return await client.get_block_number(network)
+
+    def pin_block(self, network: str, block_number: int):
+        self.provider_pool.pin_block(network, block_number)
+
+    def rate_budget(self, network: str) -> float:
+        """Requests per second the network's providers currently allow, as adjusted by their throttles."""
+        return self.provider_pool.rate_budget(network)
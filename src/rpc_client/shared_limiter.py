@@ -0,0 +1,36 @@
+import asyncio
+import multiprocessing
+import time
+
+class SharedTokenBucket:
+    """
+    Token bucket in shared memory, so processes spawned with it draw from
+    one rate budget. Used like aiolimiter.AsyncLimiter: `async with bucket`.
+    CLOCK_MONOTONIC is system-wide, so timestamps agree across processes.
+    """
+    def __init__(self, rate: float, context=multiprocessing):
+        self.rate = rate
+        # [tokens, last refill]
+        self._state = context.Array('d', [rate, time.monotonic()])
+
+    async def acquire(self):
+        while (wait := self._take()) > 0:
+            await asyncio.sleep(wait)
+
+    async def __aenter__(self):
+        await self.acquire()
+
+    async def __aexit__(self, *exc):
+        return None
+
+    def _take(self) -> float:
+        """Take a token and return 0, or return the seconds until one is due."""
+        with self._state.get_lock():
+            now = time.monotonic()
+            tokens = min(self.rate, self._state[0] + (now - self._state[1]) * self.rate)
+            self._state[1] = now
+            if tokens >= 1:
+                self._state[0] = tokens - 1
+                return 0.0
+            self._state[0] = tokens
+            return (1 - tokens) / self.rate
@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# error codes of batch items refused for rate or compute-unit limits, in an HTTP 200 answer
+THROTTLED_RPC_CODES = {429, -32005, -32090}
+
+class CircuitOpenError(httpx.HTTPError):
+    """Raised instead of sending a request to a network whose circuit is open."""
+
+class JsonRpcError(httpx.HTTPError):
+    """Raised for a call answered with an error object instead of a result."""
+    def __init__(self, error: dict):
+        self.code = error.get("code")
+        self.message = str(error.get("message", ""))
+        super().__init__(f"JSON-RPC error {self.code}: {self.message}")
+
+    @property
+    def throttled(self) -> bool:
+        return self.code in THROTTLED_RPC_CODES
+
+    @property
+    def reverted(self) -> bool:
+        # an answer about the contract, not a failure: e.g. masterCopy() on a non-Safe
+        return self.code == 3 or "revert" in self.message.lower()
+
+    @property
+    def unsupported(self) -> bool:
+        message = self.message.lower()
+        return self.code == -32601 or "not supported" in message or "unsupported" in message
+
+class NetworkThrottle:
+    """
+    Token bucket plus concurrency limit for one network, both adjusted
+    AIMD-style: they grow additively while requests succeed at normal
+    latency, shrink on latency spikes and are halved on 429/5xx responses.
+    After `failure_threshold` consecutive failures the circuit opens and
+    requests fail fast for `cooldown` seconds.
+    """
+    def __init__(
+        self,
+        network: str,
+        rate: float,
+        concurrency: int,
+        max_rate: float | None = None,
+        max_concurrency: int | None = None,
+        latency_tolerance: float = 3.0,
+        failure_threshold: int = 5,
+        cooldown: float = 30.0,
+    ):
+        self.network = network
+        self.rate = rate
+        self.limit = float(concurrency)
+        self._min_rate = 1.0
+        self._max_rate = max_rate or rate * 4
+        self._max_limit = max_concurrency or concurrency * 4
+        self._tokens = 1.0
+        self._updated = time.monotonic()
+        self._inflight = 0
+        self._slots = asyncio.Condition()
+        self._base_latency = None
+        self._latency_tolerance = latency_tolerance
+        self._failures = 0
+        self._failure_threshold = failure_threshold
+        self._cooldown = cooldown
+        self._open_until = 0.0
+        self._last_decrease = 0.0
+        # smoothed observations, used to route between providers
+        self.latency_ewma = None
+        self.error_rate = 0.0
+        self._ewma_weight = 0.2
+
+    @property
+    def is_open(self) -> bool:
+        return time.monotonic() < self._open_until
+
+    def score(self) -> float:
+        """
+        Expected latency inflated by the error rate and by how little of
+        the concurrency and token budgets is left. Throttles without a
+        latency yet score 0 so they get tried, unless they only failed.
+        """
+        if self.latency_ewma is None:
+            return 10 * self.error_rate
+        self._refill()
+        headroom = min(1 - self._inflight / self.limit, self._tokens / self.rate)
+        return self.latency_ewma * (1 + 10 * self.error_rate) / max(headroom, 0.05)
+
+    def has_headroom(self) -> bool:
+        """Whether a request sent now would get a slot and a token without waiting."""
+        if self.is_open:
+            return False
+        self._refill()
+        return self._inflight < int(self.limit) and self._tokens >= 1
+
+    @asynccontextmanager
+    async def slot(self):
+        if time.monotonic() < self._open_until:
+            raise CircuitOpenError(f"Circuit open for {self.network}")
+
+        async with self._slots:
+            await self._slots.wait_for(lambda: self._inflight < int(self.limit))
+            self._inflight += 1
+        try:
+            await self._take_token()
+            yield
+        finally:
+            async with self._slots:
+                self._inflight -= 1
+                self._slots.notify_all()
+
+    def record_success(self, latency: float):
+        self._failures = 0
+        self._observe(latency, error=False)
+        if self._base_latency is None or latency < self._base_latency:
+            self._base_latency = latency
+
+        if latency > self._base_latency * self._latency_tolerance:
+            # the remote is queueing our requests, back off a little
+            self.limit = max(1.0, self.limit * 0.9)
+            return
+
+        self.limit = min(self._max_limit, self.limit + 1 / self.limit)
+        self.rate = min(self._max_rate, self.rate + self._max_rate / 100)
+
+    def record_failure(self, throttled: bool):
+        self._failures += 1
+        self._observe(None, error=True)
+        # requests in flight together see the same congestion, halve once for them
+        if throttled and time.monotonic() - self._last_decrease > 1.0:
+            self._last_decrease = time.monotonic()
+            self.limit = max(1.0, self.limit / 2)
+            self.rate = max(self._min_rate, self.rate / 2)
+            logger.warning("Throttled on %s, limits now %.1f req/s and %d in flight",
+                           self.network, self.rate, int(self.limit))
+
+        if self._failures >= self._failure_threshold:
+            self._open_until = time.monotonic() + self._cooldown
+            logger.error("Opening circuit for %s for %.0fs after %d consecutive failures",
+                         self.network, self._cooldown, self._failures)
+
+    def _observe(self, latency: float | None, error: bool):
+        weight = self._ewma_weight
+        self.error_rate = (1 - weight) * self.error_rate + weight * error
+        if latency is not None:
+            if self.latency_ewma is None:
+                self.latency_ewma = latency
+            else:
+                self.latency_ewma = (1 - weight) * self.latency_ewma + weight * latency
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def _take_token(self):
+        while True:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+def retry_delay(attempt: int, retry_after: str | None = None, base: float = 0.5, cap: float = 30.0) -> float:
+    """
+    Seconds to wait before retry number `attempt` (0-based): the server's
+    Retry-After when given, otherwise full-jitter exponential backoff.
+    """
+    if retry_after:
+        try:
+            return min(cap, max(0.0, float(retry_after)))
+        except ValueError:
+            try:
+                return min(cap, max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time()))
+            except (TypeError, ValueError):
+                pass
+    return random.uniform(0, min(cap, base * 2 ** attempt))
@@ -0,0 +1,32 @@
+import logging
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# balanceOf(address)
+BALANCE_OF_SELECTOR = "0x70a08231"
+
+@lru_cache(maxsize=None)
+def load_token_list(path: str) -> dict[str, list[str]]:
+    """
+    Read ERC-20 contracts to query with balanceOf(), one "network 0xtoken"
+    per line like the input file, with # comments. Returns network -> tokens.
+    """
+    tokens: dict[str, list[str]] = {}
+    with open(path, 'r') as f:
+        for i, line in enumerate(f):
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            parts = line.split()
+            if len(parts) != 2:
+                logger.warning(f"Skipping malformed token line at index {i}: '{line}'")
+                continue
+            network, token = parts[0].lower(), parts[1].lower()
+            if token not in tokens.setdefault(network, []):
+                tokens[network].append(token)
+    logger.info(f"Loaded {sum(len(t) for t in tokens.values())} tokens from {path}")
+    return tokens
+
+def balance_of_calldata(owner: str) -> str:
+    return BALANCE_OF_SELECTOR + owner.removeprefix("0x").lower().rjust(64, "0")
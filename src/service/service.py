@@ -0,0 +1,207 @@
+import asyncio
+import json
+import logging
+import os
+import signal
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+from src.address_analyzer import AddressAnalyzer, AnalysisJob
+from src.config import config
+from src.file_reader import FileReader
+
+logger = logging.getLogger(__name__)
+
+REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           500: "Internal Server Error"}
+
+class ReconService:
+    """
+    Long-running mode: keeps the DB and RPC clients, their connection pools
+    and the workers alive, and takes addresses from a local HTTP API (TCP
+    and/or Unix socket) and from TXT files dropped in a watched directory.
+
+        POST /jobs          {"addresses": [["ethereum", "0x..."], ...]}
+                            202 with {"job_id": ...}, or 200 with the
+                            results when the query string has wait=1
+        GET  /jobs/<id>     status and results of a job
+        GET  /health
+    """
+    def __init__(self, db_client, rpc_client, max_jobs: int = 1000, poll_interval: float = 1.0):
+        self.address_analyzer = AddressAnalyzer(db_client, rpc_client)
+        self.file_reader = FileReader()
+        self._jobs: OrderedDict[str, AnalysisJob] = OrderedDict()
+        self._max_jobs = max_jobs
+        self._poll_interval = poll_interval
+        self._servers = []
+        self._tasks = set()
+        self._stopping = asyncio.Event()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self._stopping.set)
+
+        await self.address_analyzer.start()
+        try:
+            await self._warm_up()
+            if config.args.port:
+                server = await asyncio.start_server(self._handle, "127.0.0.1", config.args.port)
+                self._servers.append(server)
+                logger.info(f"Serving on http://127.0.0.1:{server.sockets[0].getsockname()[1]}")
+            if config.args.socket:
+                server = await asyncio.start_unix_server(self._handle, config.args.socket)
+                self._servers.append(server)
+                logger.info(f"Serving on unix:{config.args.socket}")
+            if config.args.watch_dir:
+                self._spawn(self._watch(config.args.watch_dir))
+            if config.args.input_file:
+                self._spawn(self._submit_file(config.args.input_file))
+
+            await self._stopping.wait()
+            logger.info("Shutting down")
+        finally:
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                loop.remove_signal_handler(sig)
+            for server in self._servers:
+                server.close()
+                await server.wait_closed()
+            for task in list(self._tasks):
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            await self.address_analyzer.stop()
+            if config.args.socket and os.path.exists(config.args.socket):
+                os.unlink(config.args.socket)
+
+    async def _warm_up(self):
+        # open a connection to every endpoint now, not on the first lookup
+        rpc_client = self.address_analyzer.rpc_client
+        await asyncio.gather(*(rpc_client.get_block_number(network) for network in rpc_client.client_map))
+
+    async def submit(self, addresses: List[Tuple[str, str]], source: str) -> AnalysisJob:
+        job = await self.address_analyzer.submit(addresses, source)
+        self._jobs[job.id] = job
+        # forget the oldest finished jobs
+        while len(self._jobs) > self._max_jobs:
+            oldest = next((job_id for job_id, j in self._jobs.items() if j.done), None)
+            if oldest is None:
+                break
+            del self._jobs[oldest]
+        return job
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _submit_file(self, path: str) -> AnalysisJob:
+        # results go to the database only, a file can be large
+        job = await self.address_analyzer.submit(self.file_reader.stream_addresses(path), f"file:{os.path.basename(path)}",
+                                                 collect_results=False)
+        await job.wait()
+        logger.info(f"Finished {path}: {len(job.visited)} addresses")
+        return job
+
+    async def _watch(self, directory: str):
+        done_dir = os.path.join(directory, "done")
+        os.makedirs(done_dir, exist_ok=True)
+        logger.info(f"Watching {directory} for TXT files")
+        while True:
+            names = sorted(name for name in os.listdir(directory) if name.endswith(".txt"))
+            for name in names:
+                path = os.path.join(directory, name)
+                # moved out first, so a file is taken once even if it's still being analyzed
+                target = self._done_path(done_dir, name)
+                os.replace(path, target)
+                self._spawn(self._submit_file(target))
+            await asyncio.sleep(self._poll_interval)
+
+    @staticmethod
+    def _done_path(done_dir: str, name: str) -> str:
+        # a file dropped again under the same name doesn't replace the earlier one
+        base, ext = os.path.splitext(name)
+        target = os.path.join(done_dir, name)
+        n = 1
+        while os.path.exists(target):
+            target = os.path.join(done_dir, f"{base}.{n}{ext}")
+            n += 1
+        return target
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode().partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                parts = request_line.decode(errors="replace").split()
+                method, target = (parts[0], parts[1]) if len(parts) >= 2 else ("", "")
+                try:
+                    status, payload = await self._route(method, target, body)
+                except Exception as e:
+                    logger.error(f"Error handling {method} {target}: {e}", exc_info=True)
+                    status, payload = 500, {"error": f"Internal error: {e}"}
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method: str, target: str, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        path, _, query = target.partition("?")
+        path = path.rstrip("/")
+
+        if path == "/health":
+            return 200, {"status": "ok", "queued": self.address_analyzer.queue.qsize()}
+
+        if path == "/jobs":
+            if method != "POST":
+                return 405, {"error": "Use POST to submit addresses"}
+            try:
+                addresses = self._parse_addresses(json.loads(body or b"{}"))
+            except (ValueError, TypeError) as e:
+                return 400, {"error": str(e)}
+
+            job = await self.submit(addresses, "api")
+            if "wait=1" in query.split("&"):
+                await job.wait()
+                return 200, job.to_dict()
+            return 202, {"job_id": job.id}
+
+        if path.startswith("/jobs/"):
+            job = self._jobs.get(path[len("/jobs/"):])
+            if job is None:
+                return 404, {"error": "Unknown job"}
+            return 200, job.to_dict()
+
+        return 404, {"error": f"Unknown path {path}"}
+
+    @staticmethod
+    def _parse_addresses(payload: Any) -> List[Tuple[str, str]]:
+        """Accept [network, address] pairs or {"network", "address"} objects."""
+        if isinstance(payload, dict):
+            payload = payload.get("addresses")
+        if not isinstance(payload, list):
+            raise ValueError('Expected {"addresses": [[network, address], ...]}')
+
+        addresses = []
+        for entry in payload:
+            if isinstance(entry, dict):
+                entry = (entry.get("network"), entry.get("address"))
+            if not (isinstance(entry, (list, tuple)) and len(entry) == 2 and all(isinstance(v, str) for v in entry)):
+                raise ValueError(f"Expected a [network, address] pair, got {entry!r}")
+            addresses.append((entry[0].strip().lower(), entry[1].strip().lower()))
+        return addresses
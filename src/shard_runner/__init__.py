@@ -0,0 +1 @@
+from .shard_runner import ShardRunner
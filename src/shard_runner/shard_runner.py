@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import multiprocessing
+import queue
+import zlib
+from typing import AsyncIterable, Dict, Tuple
+
+from src.address_analyzer import AddressAnalyzer
+from src.config import config
+from src.db_client import RemoteDBClient, serve_db_requests
+from src.metrics import MetricsServer, registry
+from src.profiler import SamplingProfiler
+from src.rpc_client import RPCClient, SharedTokenBucket, provider_rate_limits
+
+logger = logging.getLogger(__name__)
+
+class ShardRunner:
+    """
+    Runs the analysis in `processes` worker processes, each with its own
+    event loop, RPC client and AddressAnalyzer. Input is sharded by
+    (network, address), so an address always lands in the same shard.
+    Providers' rate limits are token buckets shared by every process, their
+    concurrency and per-network throttles split between them, and all
+    database calls go through this process's DBClient, the only writer.
+    Owners found by a crawl are analyzed by the shard that found them.
+    """
+    def __init__(self, db_client, processes: int, chunk_size: int = 500):
+        self.db_client = db_client
+        self.processes = processes
+        self.chunk_size = chunk_size
+        # spawn works the same everywhere and doesn't copy the parent's threads
+        self._context = multiprocessing.get_context("spawn")
+
+    async def process(self, addresses: AsyncIterable[Tuple[str, str]]):
+        context = self._context
+        rate_limiters = {
+            name: SharedTokenBucket(rate, context)
+            for name, rate in provider_rate_limits().items()
+        }
+        snapshots = await self._take_snapshots(rate_limiters)
+
+        requests = context.Queue()
+        responses = [context.Queue() for _ in range(self.processes)]
+        # a couple of chunks per shard, the shards' own queues do the buffering
+        inputs = [context.Queue(maxsize=2) for _ in range(self.processes)]
+        shards = [
+            context.Process(
+                target=run_shard,
+                args=(i, inputs[i], requests, responses[i], rate_limiters, snapshots),
+                name=f"shard-{i}",
+            )
+            for i in range(self.processes)
+        ]
+        for shard in shards:
+            shard.start()
+        logger.info(f"Started {self.processes} shard processes")
+
+        server = asyncio.create_task(serve_db_requests(self.db_client, requests, responses))
+        loop = asyncio.get_running_loop()
+        try:
+            await self._distribute(addresses, inputs, shards)
+            for shard in shards:
+                await loop.run_in_executor(None, shard.join)
+                if shard.exitcode:
+                    logger.error(f"{shard.name} exited with code {shard.exitcode}")
+        finally:
+            for shard in shards:
+                if shard.is_alive():
+                    shard.terminate()
+                    await loop.run_in_executor(None, shard.join)
+            # every shard has exited, so all of their requests are queued ahead of this
+            requests.put(None)
+            await server
+
+    async def _take_snapshots(self, rate_limiters) -> Dict[str, Tuple[int, int]]:
+        # taken once here, so every shard pins the same block
+        if not (config.args.snapshot or config.args.blocks):
+            return {}
+        rpc_client = RPCClient(rate_limiters)
+        try:
+            return await AddressAnalyzer(self.db_client, rpc_client).take_snapshots()
+        finally:
+            await rpc_client.aclose()
+
+    async def _distribute(self, addresses, inputs, shards):
+        chunks = [[] for _ in inputs]
+        async for network, address in addresses:
+            shard = zlib.crc32(f"{network}:{address}".encode()) % len(inputs)
+            chunks[shard].append((network, address))
+            if len(chunks[shard]) >= self.chunk_size:
+                await self._send(inputs[shard], chunks[shard], shards[shard])
+                chunks[shard] = []
+
+        for shard, chunk in enumerate(chunks):
+            if chunk:
+                await self._send(inputs[shard], chunk, shards[shard])
+            await self._send(inputs[shard], None, shards[shard])
+
+    async def _send(self, inputs, chunk, shard):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                return await loop.run_in_executor(None, inputs.put, chunk, True, 1.0)
+            except queue.Full:
+                # a full queue is a busy shard, unless it's gone
+                if not shard.is_alive():
+                    raise RuntimeError(f"{shard.name} exited with code {shard.exitcode}")
+
+def run_shard(shard: int, inputs, requests, responses, rate_limiters, snapshots):
+    """Entry point of a shard process."""
+    config.setup_logging()
+    try:
+        asyncio.run(_run_shard(shard, inputs, requests, responses, rate_limiters, snapshots))
+    except KeyboardInterrupt:
+        pass
+
+async def _run_shard(shard: int, inputs, requests, responses, rate_limiters, snapshots):
+    db_client = RemoteDBClient(shard, requests, responses)
+    rpc_client = RPCClient(rate_limiters, shards=config.args.processes)
+    address_analyzer = AddressAnalyzer(db_client, rpc_client)
+    address_analyzer.use_snapshots(snapshots)
+    metrics_server = None
+    profiler = None
+
+    try:
+        if config.args.profile:
+            profiler = SamplingProfiler(config.args.profile_interval_ms / 1000)
+            profiler.start()
+        if config.args.metrics_port is not None:
+            metrics_server = MetricsServer(config.args.metrics_port + 1 + shard)
+            await metrics_server.start()
+        await db_client.connect()
+        await address_analyzer.process(_receive(inputs))
+    except Exception as e:
+        logger.error(f"An unhandled error occurred in shard {shard}: {e}", exc_info=True)
+        raise
+    finally:
+        await rpc_client.aclose()
+        await db_client.close()
+        if metrics_server:
+            await metrics_server.aclose()
+        if config.args.metrics_summary:
+            print(f"== shard {shard}\n{registry.summary()}", flush=True)
+        if profiler:
+            profiler.stop()
+            profiler.write(f"{config.args.profile}.shard-{shard}")
+
+async def _receive(inputs):
+    loop = asyncio.get_running_loop()
+    while (chunk := await loop.run_in_executor(None, inputs.get)) is not None:
+        for pair in chunk:
+            yield pair
@@ -0,0 +1,45 @@
+import logging
+import os
+import pickle
+from pathlib import Path
+
+import aiosql
+from aiosql.query_loader import QueryLoader
+
+logger = logging.getLogger(__name__)
+
+class CompiledQueryLoader(QueryLoader):
+    """
+    aiosql's loader with its parsed queries kept in __pycache__, the way
+    Python keeps bytecode: parsing queries.sql takes tens of milliseconds,
+    loading the pickle a couple. A cache whose source changed since, by
+    size or modification time, or that fails to load is parsed again and
+    rewritten.
+    """
+    def load_query_data_from_file(self, path: Path, ns_parts=None, encoding=None):
+        stat = path.stat()
+        key = (aiosql.__version__, type(self.driver_adapter).__name__, stat.st_mtime_ns, stat.st_size)
+        cache = path.parent / "__pycache__" / f"{path.name}.pickle"
+        try:
+            with open(cache, "rb") as f:
+                cached_key, query_data = pickle.load(f)
+            if cached_key == key:
+                return query_data
+        except Exception:
+            pass
+
+        query_data = super().load_query_data_from_file(path, ns_parts or [], encoding)
+        try:
+            os.makedirs(cache.parent, exist_ok=True)
+            # written aside and renamed, so concurrent processes never read half a file
+            partial = cache.with_name(f"{cache.name}.{os.getpid()}")
+            with open(partial, "wb") as f:
+                pickle.dump((key, query_data), f)
+            os.replace(partial, cache)
+        except (OSError, pickle.PicklingError) as e:
+            # e.g. a read-only install, it is only slower
+            logger.debug(f"Can't write compiled queries to {cache}: {e}")
+        return query_data
+
+def load_queries(path: str, driver_adapter: str = "aiosqlite"):
+    return aiosql.from_path(path, driver_adapter, loader_cls=CompiledQueryLoader)
@@ -1,12 +1,7 @@
-import asyncio
 import logging
 import sys
 
-from src.address_analyzer import AddressAnalyzer
 from src.config import config
-from src.db_client import DBClient
-from src.file_reader import FileReader
-from src.rpc_client import RPCClient
 
 async def main():
     if not config.args:
@@ -16,15 +11,49 @@ async def main():
     logger = logging.getLogger(__name__)
     logger.info("Starting Web3 Address Reconnaissance Tool")
 
+    # imported once the arguments are known: --help doesn't load the clients,
+    # and a query or an export doesn't load the RPC ones
+    import asyncio
+    from src.db_client import DBClient
+    from src.file_reader import FileReader
+    from src.metrics import MetricsServer, registry
+    from src.profiler import SamplingProfiler
+
     db_client = DBClient()
-    rpc_client = RPCClient()
     file_reader = FileReader()
-    address_analyzer = AddressAnalyzer(db_client, rpc_client)
+    rpc_client = None
+    metrics_server = None
+    profiler = None
 
     try:
+        if config.args.profile:
+            profiler = SamplingProfiler(config.args.profile_interval_ms / 1000)
+            profiler.start()
+        if config.args.metrics_port is not None:
+            metrics_server = MetricsServer(config.args.metrics_port)
+            await metrics_server.start()
         await db_client.connect()
-        addresses = file_reader.get_addresses()
-        await address_analyzer.process(addresses)
+        if config.args.command == "query":
+            from src.query import QueryRunner
+            await QueryRunner(db_client, config.args.format).run(config.args.query, config.args)
+        elif config.args.export_dir:
+            from src.exporter import Exporter
+            await Exporter(db_client, config.args.export_dir, config.args.export_page_size).export()
+        elif config.args.serve:
+            from src.rpc_client import RPCClient
+            from src.service import ReconService
+            rpc_client = RPCClient()
+            await ReconService(db_client, rpc_client).run()
+        elif config.args.processes > 1:
+            # shard processes have their own RPC clients, this one only writes
+            from src.shard_runner import ShardRunner
+            await ShardRunner(db_client, config.args.processes).process(file_reader.stream_addresses())
+        else:
+            from src.address_analyzer import AddressAnalyzer
+            from src.rpc_client import RPCClient
+            rpc_client = RPCClient()
+            address_analyzer = AddressAnalyzer(db_client, rpc_client)
+            await address_analyzer.process(file_reader.stream_addresses())
 
     except asyncio.CancelledError:
         logger.info("Main task was cancelled, shutting down.")
@@ -33,9 +62,22 @@ async def main():
         logger.error(f"An unhandled error occurred: {e}", exc_info=True)
 
     finally:
+        if rpc_client:
+            await rpc_client.aclose()
         await db_client.close()
+        if metrics_server:
+            await metrics_server.aclose()
+        if config.args.metrics_summary:
+            print(registry.summary())
+        if profiler:
+            profiler.stop()
+            profiler.write(config.args.profile)
 
 if __name__ == "__main__":
+    # --help and usage errors end here, before asyncio or any client is imported
+    if not config.args:
+        sys.exit(0)
+    import asyncio
     try:
         asyncio.run(main())
     except KeyboardInterrupt: